@@ -0,0 +1,120 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# upper bounds in seconds of the histogram buckets, from a single alignment up to a whole request
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Timer:
+
+
+    def __init__(self, metrics: 'LatencyMetrics', stage: str):
+        """
+        Context manager adding the time spent inside it to a stage's histogram
+
+        :param metrics: the histograms to add to
+        :param   stage: the stage timed
+        """
+        self.metrics = metrics
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+
+class LatencyMetrics:
+
+
+    def __init__(self, buckets: Optional[Tuple[float,...]]=DEFAULT_BUCKETS):
+        """
+        Thread safe latency histograms, one per stage of handling a request, eg. the input
+        word's trie search or the GPT sentence ends. Rendered in the Prometheus text format
+        so the percentiles of every stage can be monitored.
+
+        :param buckets: upper bounds in seconds of the histogram buckets, ascending (default DEFAULT_BUCKETS)
+        """
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str,List[int]] = {} # stage -> count per bucket, the last bucket is +Inf
+        self.sums: Dict[str,float] = {} # stage -> total seconds
+        self.lock = threading.Lock()
+
+    def time(self, stage: str) -> Timer:
+        """
+        Return a context manager timing the code inside it as stage, eg.
+            with metrics.time('search'):
+                ...
+        """
+        return Timer(self, stage)
+
+    def observe(self, stage: str, seconds: float):
+        """
+        Add a duration to stage's histogram
+        """
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(stage)
+            if histogram is None:
+                histogram = [0] * (len(self.buckets) + 1)
+                self.histograms[stage] = histogram
+                self.sums[stage] = 0.0
+            histogram[bucket] += 1
+            self.sums[stage] += seconds
+
+    def count(self, stage: str) -> int:
+        """
+        Return the number of durations added to stage
+        """
+        with self.lock:
+            return sum(self.histograms.get(stage, []))
+
+    def quantile(self, stage: str, q: float) -> Optional[float]:
+        """
+        Return an estimate of the q quantile of stage's durations, eg. 0.95 for p95, interpolated
+        within its bucket like Prometheus' histogram_quantile. None when nothing was added.
+        Durations over the last bucket are estimated as the last bucket's upper bound.
+        """
+        with self.lock:
+            histogram = list(self.histograms.get(stage, []))
+        total = sum(histogram)
+        if not total:
+            return None
+
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(histogram):
+            if cumulative + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self, name: Optional[str]='mnemonics_stage_duration_seconds') -> str:
+        """
+        Return every stage's histogram in the Prometheus text exposition format
+
+        :param name: name of the metric, the stage is its label
+        """
+        with self.lock:
+            histograms = { stage: list(histogram) for stage, histogram in self.histograms.items() }
+            sums = dict(self.sums)
+
+        lines = [ '# HELP ' + name + ' Time spent in each stage of handling a request.', '# TYPE ' + name + ' histogram' ]
+        for stage in sorted(histograms):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), histograms[stage]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {sums[stage]!r}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+# the histograms of this process, the stages are timed where they run
+metrics = LatencyMetrics()
@@ -2,44 +2,130 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from PhoneTrie import PhoneNode
+    from SearchTrace import SearchTrace
+    from gensim.models.keyedvectors import KeyedVectors
 
+import copy
+import threading
+from collections import namedtuple
+from functools import lru_cache
 from math import trunc
-import nltk
+from LatencyMetrics import metrics
+import numpy as np
 from numpy import character
-from scipy.spatial import distance
-from gensim.models.keyedvectors import KeyedVectors
 
 import aline
-from typing import Optional, List, Union
+from typing import Optional, List, Union, Tuple
 
 phonetic_multiplier = 5.0
 orthographic_multiplier = 3
 semantic_multiplier = 50
 aoa_multiplier = 3.0
 
-model = KeyedVectors.load_word2vec_format("word_embeddings/english/glove.6B.50d.txt", binary=False)
+# Multipliers a search scores its matches with, fixed when the search starts
+Weights = namedtuple('Weights', ['phonetic', 'orthographic', 'semantic', 'aoa'])
+
+def current_weights() -> Weights:
+    """
+    Return the module's current multipliers as Weights
+    """
+    return Weights(phonetic_multiplier, orthographic_multiplier, semantic_multiplier, aoa_multiplier)
+
+model = None # word embeddings, loaded by load_embeddings the first time they're needed
+model_lock = threading.Lock()
+
+def load_embeddings() -> KeyedVectors:
+    """
+    Return the word embeddings, loading them and the modules they need on the first call
+    """
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                from gensim.models.keyedvectors import KeyedVectors
+                model = KeyedVectors.load_word2vec_format("word_embeddings/english/glove.6B.50d.txt", binary=False)
+    return model
+
+def cosine_distances(translation_vectors: np.ndarray, word_vectors: np.ndarray) -> np.ndarray:
+    """
+    Return the cosine distance between every translation vector (rows) and word vector (columns).
+    Computed in float64 with every dot product summed along its own row, so a distance doesn't
+    depend on how many other vectors it's computed with and ties rank the same either way.
+    """
+    translation_vectors = translation_vectors.astype(np.float64)
+    word_vectors = word_vectors.astype(np.float64)
+    dots = (translation_vectors[:, np.newaxis, :] * word_vectors[np.newaxis, :, :]).sum(axis=-1)
+    norms = np.outer((translation_vectors * translation_vectors).sum(axis=-1), (word_vectors * word_vectors).sum(axis=-1))
+    return np.clip(1.0 - dots / np.sqrt(norms), 0.0, 2.0)
+
 def semantic_distance(word1: str, word2: str, multiplier: Optional[float]=1.0) -> float:
     """
     Return the cosine distance between the word2vec embeddings for word1, word2.
     If no embeddings are found, defaults to 20. Currently only has values for english.
     """
-    try:
-        word1_embedding = model[word1]
-        word2_embedding = model[word2]
-        dist = distance.cosine(word1_embedding, word2_embedding) * multiplier
-        return dist
-    except:
-        return 20 * multiplier
+    embeddings = load_embeddings()
+    with metrics.time('semantic'):
+        try:
+            word1_embedding = embeddings[word1]
+            word2_embedding = embeddings[word2]
+            dist = float(cosine_distances(word2_embedding[np.newaxis], word1_embedding[np.newaxis])[0, 0]) * multiplier
+            return dist
+        except:
+            return 20 * multiplier
+
+def semantic_distance_matrix(words: List[str], translations: List[str], multiplier: Optional[float]=1.0) -> np.ndarray:
+    """
+    Return semantic_distance for every pair of translation and word as a matrix with a row per
+    translation and a column per word, computed with one call to cosine_distances instead of
+    one per pair. Pairs where either word has no embedding get 20, the same as semantic_distance.
+    """
+    embeddings = load_embeddings()
+    with metrics.time('semantic'):
+        distances = np.full((len(translations), len(words)), 20.0)
+        word_columns = [ i for i, word in enumerate(words) if word in embeddings.key_to_index ]
+        translation_rows = [ i for i, translation in enumerate(translations) if translation in embeddings.key_to_index ]
+        if word_columns and translation_rows:
+            word_vectors = embeddings.vectors[[ embeddings.key_to_index[words[i]] for i in word_columns ]]
+            translation_vectors = embeddings.vectors[[ embeddings.key_to_index[translations[i]] for i in translation_rows ]]
+            distances[np.ix_(translation_rows, word_columns)] = cosine_distances(translation_vectors, word_vectors)
+        return distances * multiplier
+
+@lru_cache(maxsize=65536)
+def alignment_end(matched_phones: str, target_phones: str) -> Tuple[int,int]:
+    """
+    Return (index after the last aligned matched phone, length of the alignment) for the
+    ALINE alignment of matched_phones against target_phones. Cached since homophones and
+    different word sequences frequently produce the same matched phones.
+    """
+    with metrics.time('alignment'):
+        alignment = aline.align(matched_phones, target_phones)
+
+    # Find end of alignment
+    len_alignment = len(alignment[0])
+    last_idx_aligned = len_alignment
+    for i in reversed(range(len(alignment[0]))):
+        if alignment[0][i][0] != '-':
+            last_idx_aligned = i + 1
+            break
+    return last_idx_aligned, len_alignment
+
+# A path merged into a Match with the same matched phones, only stores what differs between the two
+Alternate = namedtuple('Alternate', ['matched_words', 'matched_phones_raw', 'delta', 'order'])
 
 class Match:
 
 
-    def __init__(self, input_node: PhoneNode, translation: Optional[str]=None):
+    def __init__(self, input_node: PhoneNode, translation: Optional[str]=None, semantic_distances: Optional[dict]=None, weights: Optional[Weights]=None, trace: Optional[SearchTrace]=None):
         """
         The Match class can be used to store data about a mnemonic match as it is built.
 
-        :param   input_node: node in a PhoneTrie to build a Match out of
-        :param  translation: translation of word in output language, used for semantic difference
+        :param         input_node: node in a PhoneTrie to build a Match out of
+        :param        translation: translation of word in output language, used for semantic difference
+        :param semantic_distances: word -> semantic distance to translation, shared by all the matches built
+                                   from this one so each word's distance is only computed once (optional)
+        :param            weights: multipliers to score the match with (default the module's current multipliers)
+        :param              trace: counts the alignments and semantic distances computed, shared by all
+                                   the matches built from this one (optional)
         """
         self.matched_words = ''
         self.matched_phones = ''
@@ -49,10 +135,15 @@ class Match:
         self.target_phones_raw = input_node.phones_raw
         self.target_definitions = input_node.definitions
         self.translation = translation
+        self.semantic_distances = {} if semantic_distances is None else semantic_distances
+        self.weights = weights or current_weights()
+        self.trace = trace
         self.delta = 0
         self.is_fully_matched = False
         self.search_failed = False # in case final phones can't be matched
         self.unmatched_phones = input_node.phones
+        self.order = 0 # when the match was added to its MatchList, breaks delta ties
+        self.alternates = [] # paths merged into this match, see MatchList.add_match
 
     def get_phones_unmatched(self) -> Union[None,List[character]]:
         """
@@ -72,20 +163,18 @@ class Match:
             return self.target_phones
 
         # Get alignment using the ALINE algorithm
-        alignment = aline.align(self.matched_phones, self.target_phones)
-
-        # Find end of alignment
-        len_alignment = len(alignment[0])
-        last_idx_aligned = len_alignment
-        for i in reversed(range(len(alignment[0]))):
-            if alignment[0][i][0] != '-':
-                last_idx_aligned = i + 1
-                break
+        if self.trace:
+            self.trace.align_calls += 1
+            with self.trace.counting_alignment():
+                last_idx_aligned, len_alignment = alignment_end(self.matched_phones, self.target_phones)
+        else:
+            last_idx_aligned, len_alignment = alignment_end(self.matched_phones, self.target_phones)
 
         if last_idx_aligned == len_alignment:
             self.is_fully_matched = True
             # add on the orthographc distance to the delta once all phones are matched
-            self.delta += nltk.edit_distance(self.matched_words, self.target_word) * orthographic_multiplier
+            from nltk import edit_distance # nltk takes a while to import, so only when needed
+            self.delta += edit_distance(self.matched_words, self.target_word) * self.weights.orthographic
             return None
         else:
             return self.target_phones[last_idx_aligned:]
@@ -102,52 +191,174 @@ class Match:
         self.matched_phones = self.matched_phones + node.phones
         self.matched_phones_raw = self.matched_phones_raw + ' ' + node.phones_raw
 
-        self.delta += phonetic_delta * phonetic_multiplier
-        self.delta += node.aoa * aoa_multiplier
+        self.delta += phonetic_delta * self.weights.phonetic
+        self.delta += node.aoa * self.weights.aoa
         if self.translation:
-            self.delta += semantic_distance(node.word, self.translation, semantic_multiplier)
+            if node.word not in self.semantic_distances:
+                if self.trace:
+                    self.trace.semantic_lookups += 1
+                self.semantic_distances[node.word] = semantic_distance(node.word, self.translation, self.weights.semantic)
+            self.delta += self.semantic_distances[node.word]
 
         self.unmatched_phones = self.get_phones_unmatched()
         if not self.unmatched_phones:
             self.is_fully_matched = True
             self.matched_words = self.matched_words.strip()
 
+    def extend(self, node: PhoneNode, phonetic_delta: float) -> Match:
+        """
+        Return a copy of the match with the newly matched phones added, the copy has no alternates
+
+        :param           node: the PhoneTrie node for the matched word/phones
+        :param phonetic_delta: the phonetic distance between the matched phones and the node
+        """
+        new_match = copy.copy(self)
+        new_match.alternates = []
+        new_match.add_new_matched_phones(node, phonetic_delta)
+        return new_match
+
+    def extend_alternate(self, alternate: Alternate, node: PhoneNode, phonetic_delta: float, extended: Match) -> Alternate:
+        """
+        Return the alternate path extended by node, without aligning its phones again. The alternate
+        has this match's matched phones, so its extension has the alignment extended has, only the
+        words and delta differ. The delta is summed in the order extend and MatchList.add_match do,
+        so it is exactly the delta the path would get as a match of its own.
+
+        :param      alternate: one of this match's alternates
+        :param           node: the PhoneTrie node for the matched word/phones
+        :param phonetic_delta: the phonetic distance between the matched phones and the node
+        :param       extended: this match extended by node
+        :returns             : the extended alternate, its order is set when it is added to a MatchList
+        """
+        matched_words = alternate.matched_words + ' ' + node.word
+        delta = alternate.delta
+        delta += phonetic_delta * self.weights.phonetic
+        delta += node.aoa * self.weights.aoa
+        if self.translation:
+            delta += self.semantic_distances[node.word]
+
+        if extended.unmatched_phones is None:
+            # all phones are matched, get_phones_unmatched adds the orthographic distance when extending
+            # and again when the match is added, after its words are stripped
+            from nltk import edit_distance
+            delta += edit_distance(matched_words, self.target_word) * self.weights.orthographic
+            matched_words = matched_words.strip()
+            delta += edit_distance(matched_words, self.target_word) * self.weights.orthographic
+        elif not extended.unmatched_phones:
+            matched_words = matched_words.strip()
+        return Alternate(matched_words, alternate.matched_phones_raw + ' ' + node.phones_raw, delta, None)
+
+    def get_path(self, alternate: Optional[Alternate]=None) -> Match:
+        """
+        Return a copy of this match, without alternates, with the path stored in alternate
+
+        :param alternate: one of this match's alternates, or None for the match's own path
+        """
+        path = copy.copy(self)
+        path.alternates = []
+        if alternate:
+            path.matched_words = alternate.matched_words
+            path.matched_phones_raw = alternate.matched_phones_raw
+            path.delta = alternate.delta
+            path.order = alternate.order
+        return path
+
+    def to_alternate(self) -> Alternate:
+        """
+        Return the path of this match in the compact form it has when merged into another match
+        """
+        return Alternate(self.matched_words, self.matched_phones_raw, self.delta, self.order)
+
+    def state_key(self) -> Tuple[str,bool,bool]:
+        """
+        Return the key of the matches that are merged. The matched phones decide the alignment and
+        so the unmatched phones, the phonetic matches and every later alignment, for any words. Matches
+        with the same unmatched phones and word count can still differ there, since the same unmatched
+        phones can follow differently aligned matched phones.
+        """
+        return (self.matched_phones, self.is_fully_matched, self.search_failed)
+
+def get_paths(matches: List[Match]) -> List[Tuple[Match,Optional[Alternate]]]:
+    """
+    Return (match, alternate) for the path of every match and each of its alternates, the alternate
+    is None for a match's own path. Sorted by (delta, order), the order the paths would have in a
+    beam of unmerged matches sorted by delta.
+
+    :param matches: matches from MatchList.remove_and_retrieve_unfinished_matches
+    """
+    paths = []
+    for match in matches:
+        paths.append((match.delta, match.order, match, None))
+        paths.extend([ (alternate.delta, alternate.order, match, alternate) for alternate in match.alternates ])
+    paths.sort(key=lambda x: (x[0], x[1]))
+    return [ (match, alternate) for _, _, match, alternate in paths ]
+
 class MatchList:
 
 
     def __init__(self):
         """
         MatchList is used to keep track of the matches as they are updated.
+        Unfinished matches with the same state key are merged, the first one added keeps
+        the others as its alternates so they are only aligned and searched for once.
         """
-        self.unfinished_matches = []
+        self.unfinished_matches = {} # state key -> match the other matches with that key are merged into
         self.finished_matches = []
+        self.num_added = 0 # orders the paths in the order they were added
+        self.num_discarded = 0 # unfinished paths that didn't make the N best of their round
 
     def add_match(self, match: Match):
         """
         Add the match to the MatchList
 
-        :param match: the match to be added
+        :param match: the match to be added, with no alternates
         """
+        match.order = self.num_added
+        self.num_added += 1
         if match.get_phones_unmatched() == None:
             self.finished_matches.append(match)
+            return
+
+        merged = self.unfinished_matches.setdefault(match.state_key(), match)
+        if merged is not match:
+            merged.alternates.append(match.to_alternate())
+
+    def add_alternate(self, match: Match, alternate: Alternate):
+        """
+        Add a path with the same matched phones as match, after match was added
+
+        :param     match: a match added to the MatchList
+        :param alternate: path to add, eg. from match's parent's extend_alternate
+        """
+        alternate = alternate._replace(order=self.num_added)
+        self.num_added += 1
+        if match.unmatched_phones is None:
+            self.finished_matches.append(match.get_path(alternate))
         else:
-            self.unfinished_matches.append(match)
+            self.unfinished_matches[match.state_key()].alternates.append(alternate)
 
     def remove_and_retrieve_unfinished_matches(self, N: Optional[int]=10) -> List[Match]:
         """
-        Return the N best unfinished matches, and clear the unfinished_matches list
-        Checks the matches are not complete first.
+        Return the unfinished matches holding the N best paths, and clear the unfinished_matches.
+        Each returned match is its best path among the N best, with the others as its alternates.
+        Checks the paths are not complete first, complete ones are split into finished matches.
 
-        :param N: max number of matches to retrieve (default 10)
-        :returns: returns the top N best incomplete matches
+        :param N: max number of paths to retrieve (default 10)
+        :returns: returns the matches containing the top N best incomplete paths
         """
+        paths = get_paths(self.unfinished_matches.values())
+        self.num_discarded += max(len(paths) - N, 0)
+        selected = {} # id of match -> its best selected path, holding the others
         temp_unfinished = []
-        for match in sorted(self.unfinished_matches, key=lambda x: x.delta)[:N]:
+        for match, alternate in paths[:N]:
             if match.is_fully_matched and not match.search_failed:
-                self.finished_matches.append(match)
+                self.finished_matches.append(match.get_path(alternate))
+            elif id(match) in selected:
+                selected[id(match)].alternates.append(alternate or match.to_alternate())
             else:
-                temp_unfinished.append(match)
-        self.unfinished_matches = []
+                selected[id(match)] = match.get_path(alternate)
+                temp_unfinished.append(selected[id(match)])
+        self.unfinished_matches = {}
         return temp_unfinished
 
     def get_finished_matches(self, N: Optional[int]=10) -> List[Match]:
@@ -0,0 +1,98 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional, Set, Tuple
+import MatchList
+
+def weights_key(weights: Optional[MatchList.Weights]=None) -> str:
+    """
+    Return the multipliers as a string, default the current MatchList multipliers. Mnemonics are
+    stored under the multipliers they were found with so changing them never serves stale results
+    """
+    return ",".join([ str(float(m)) for m in weights or MatchList.current_weights() ])
+
+def beam_width(N: int) -> int:
+    """
+    Return the beam width WWUTransphoner.get_mnemonics searches with for N mnemonics. A wider
+    beam finds other mnemonics, so a row is only served to searches with the beam it was found with
+    """
+    return max(N, 5)
+
+class MnemonicStore:
+
+
+    def __init__(self, path: str):
+        """
+        SQLite store of precomputed mnemonics, one row per input word, language pair and set
+        of multipliers holding the word's N best mnemonics with their phones. Rows are written
+        by precompute_mnemonics.py and read by WWUTransphoner before it searches.
+        Each thread gets its own connection so a store can be shared by a server's threads.
+
+        :param path: file of the SQLite database, created if it doesn't exist
+        """
+        self.path = path
+        self.local = threading.local()
+        with self.__connection() as connection:
+            connection.execute("""CREATE TABLE IF NOT EXISTS mnemonics (
+                                      input_language TEXT,
+                                      output_language TEXT,
+                                      weights TEXT,
+                                      word TEXT,
+                                      n INTEGER,
+                                      mnemonics TEXT,
+                                      PRIMARY KEY (input_language, output_language, weights, word)
+                                  ) WITHOUT ROWID""")
+
+    def __connection(self) -> sqlite3.Connection:
+        """
+        Return this thread's connection to the database, a forked process opens its own
+        """
+        connection, pid = getattr(self.local, 'connection', (None, None))
+        if connection is None or pid != os.getpid(): # connections can't be used across a fork
+            connection = sqlite3.connect(self.path, timeout=30)
+            self.local.connection = (connection, os.getpid())
+        return connection
+
+    def get(self, input_language: str, output_language: str, word: str, N: int, weights: Optional[MatchList.Weights]=None) -> Optional[List[Tuple[str,str,str]]]:
+        """
+        Return the N best stored mnemonics of word for the multipliers, or None when the
+        word isn't stored, fewer than N mnemonics were stored for it or they were searched for
+        with a different beam width than N mnemonics are, see beam_width
+
+        :param  input_language: language of word
+        :param output_language: language of the mnemonics
+        :param            word: the input word
+        :param               N: number of mnemonics wanted
+        :param         weights: multipliers the mnemonics were found with (default the current multipliers)
+        :returns              : a list of (a mnemonic phrase, its phonetic data, the phonetic data of the input phrase)
+        """
+        row = self.__connection().execute(
+            "SELECT n, mnemonics FROM mnemonics WHERE input_language = ? AND output_language = ? AND weights = ? AND word = ?",
+            (input_language, output_language, weights_key(weights), word)).fetchone()
+        if row is None or row[0] < N or beam_width(row[0]) != beam_width(N):
+            return None
+        return [ tuple(mnemonic) for mnemonic in json.loads(row[1])[:N] ]
+
+    def put_many(self, input_language: str, output_language: str, N: int, results: Iterable[Tuple[str,List[Tuple[str,str,str]]]]):
+        """
+        Store the mnemonics of several words in one transaction, replacing earlier rows of the words
+
+        :param  input_language: language of the words
+        :param output_language: language of the mnemonics
+        :param               N: number of mnemonics that were searched for
+        :param         results: (word, its mnemonics as returned by get) pairs
+        """
+        weights = weights_key()
+        with self.__connection() as connection:
+            connection.executemany("INSERT OR REPLACE INTO mnemonics VALUES (?, ?, ?, ?, ?, ?)",
+                                   [ (input_language, output_language, weights, word, N, json.dumps(mnemonics)) for word, mnemonics in results ])
+
+    def stored_words(self, input_language: str, output_language: str, N: int) -> Set[str]:
+        """
+        Return the words whose stored mnemonics get serves N mnemonics from, for the current multipliers
+        """
+        rows = self.__connection().execute(
+            "SELECT word FROM mnemonics WHERE input_language = ? AND output_language = ? AND weights = ? AND n >= ? AND MAX(n, 5) = ?",
+            (input_language, output_language, weights_key(), N, beam_width(N)))
+        return { row[0] for row in rows }
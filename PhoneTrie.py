@@ -2,16 +2,42 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
     from MatchList import Match
+    from SearchBudget import SearchBudget
+    from SearchTrace import SearchTrace
 
 import csv
 from io import TextIOWrapper
 import re
-from typing import List, Union, Tuple
+from typing import Callable, Dict, List, Optional, Set, Union, Tuple
 
 from numpy import character
 import aline
 import heapq
 import math
+import threading
+
+tries = {} # PhoneTrie per language code, built by shared_trie the first time they're needed
+tries_lock = threading.Lock()
+language_locks = {}
+
+def shared_trie(language_code: str) -> PhoneTrie:
+    """
+    Return the PhoneTrie for language_code, building it on the first call. The trie is shared
+    by every caller in the process, searching it doesn't modify it so it must not be changed.
+
+    :param language_code: language of the trie, see PhoneTrie
+    :raises   ValueError: raises value error when provided language_code not supported
+    """
+    trie = tries.get(language_code)
+    if trie is None:
+        with tries_lock:
+            language_lock = language_locks.setdefault(language_code, threading.Lock())
+        with language_lock: # other languages can be built at the same time
+            trie = tries.get(language_code)
+            if trie is None:
+                trie = PhoneTrie(language_code)
+                tries[language_code] = trie
+    return trie
 
 class PhoneNode:
 
@@ -27,6 +53,7 @@ class PhoneNode:
         self.phones_raw = ""
         self.children = {}
         self.aoa = 0
+        self.min_aoa = math.inf # lowest age of aquisition of any word in this node's subtree
         self.ignored = False
         self.definitions = None
         self.next = None # used for when words collide, aka 2 words same pronunciation
@@ -54,7 +81,6 @@ class PhoneTrie:
         """
         self.root = PhoneNode("")
         self.num_nodes = 0
-        self.n_best_list = [] # heap
         if language_code == 'de': # german
             self.insert_dictionary('dictionaries/german/phones_de.csv')
         elif language_code == 'en': # english
@@ -133,6 +159,7 @@ class PhoneTrie:
             return
 
         node = self.root
+        node.min_aoa = min(node.min_aoa, aoa)
         for char in phones:
             if char in node.children:
                 node = node.children[char]
@@ -140,6 +167,7 @@ class PhoneTrie:
                 new_node = PhoneNode(char)
                 node.children[char] = new_node
                 node = new_node
+            node.min_aoa = min(node.min_aoa, aoa)
 
         if node.is_word: # collision, already had a word with same prounciation
             while node.next != None:
@@ -161,6 +189,46 @@ class PhoneTrie:
         """
         return self.__search(self.root, word)
 
+    def search_words(self, words: List[str]) -> Dict[str,PhoneNode]:
+        """
+        Return the nodes of several words with a single walk of the trie, each word maps to the node
+        search would return for it, words that aren't in the trie are left out
+        """
+        found = {}
+        self.__search_words(self.root, set(words), found)
+        return found
+
+    def __search_words(self, node: PhoneNode, words: Set[str], found: Dict[str,PhoneNode]):
+        """
+        Add the nodes for words in node's subtree to found, visiting nodes in the same order as __search
+        """
+        if node.is_word and node.word in words and node.word not in found:
+            found[node.word] = node
+        for c in node.children: # check all nodes children
+            if len(found) == len(words):
+                return
+            self.__search_words(node.children[c], words, found)
+        while node.next != None: # check all different words with same pronunciation
+            node = node.next
+            if node.is_word and node.word in words and node.word not in found:
+                found[node.word] = node
+
+    def words(self) -> List[str]:
+        """
+        Return every word in the trie once, including words sharing a pronunciation
+        """
+        words = {}
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            temp = node
+            while temp: # all the words with the same pronunciation
+                if temp.is_word:
+                    words[temp.word] = None
+                temp = temp.next
+            nodes.extend(node.children.values())
+        return list(words)
+
     def __search(self, node: PhoneNode, word: str):
         """
         Return the node from the trie that corresponds to word
@@ -224,64 +292,187 @@ class PhoneTrie:
 
 
 
-    def __add_to_running_list(self, delta_and_node: Tuple[float,PhoneNode]):
-        """
-        For use with find_phonetic_match, adds a node and it's delta to the running
-        list of N best phonetic matches.
-
-        The N best list is done as a heap so the max delta node can be removed
-        when the heap has more than N nodes
-        Also updates the self.max value so the search can abandon early words when
-        the delta exceeds the max
-
-        :param delta_and_node: (delta, node), a tuple containing the nodes delta and the node
-        """
-        if not delta_and_node[1].ignored:
-            if len(self.n_best_list) < self.N:
-                heapq.heappush(self.n_best_list, delta_and_node)
-            else:
-                self.max = heapq.heappushpop(self.n_best_list, delta_and_node)[0]
-
-    def find_phonetic_match(self, unfinished_match: Match, N: int) -> List[Tuple[float,PhoneNode]]:
+    def find_phonetic_match(self, unfinished_match: Match, N: int, phonetic_multiplier: Optional[float]=1.0, aoa_multiplier: Optional[float]=0.0, budget: Optional[SearchBudget]=None, ignored_words: Optional[Set[str]]=frozenset(), trace: Optional[SearchTrace]=None) -> List[Tuple[float,PhoneNode]]:
         """
         Searches the trie for a similar set of phones to the unmatched phones of unfinished_match
         Similarity is done by comparing an unmatched phone with a phone from the trie and adding
         their similarity score to a running total delta, the similarity score is found using
         the aline algorithms' delta() function. This allows for reusing delta for words with
         common prefixes.
+        Matches are ranked by delta * phonetic_multiplier + aoa * aoa_multiplier, and subtrees are
+        abandoned once their delta and lowest age of aquisition can't beat the N best matches.
+        The search doesn't modify the trie, so a trie can be searched by several threads at once.
 
         :param unfinished_match: a Match object containing unmatched phones to be matched
         :param                N: number of matches to return
+        :param phonetic_multiplier: weight of the phonetic delta in the ranking (default 1.0)
+        :param   aoa_multiplier: weight of the age of aquisition in the ranking (default 0.0)
+        :param           budget: counts visited nodes, the search stops early once it's exhausted (default None)
+        :param    ignored_words: words that are never matched, on top of nodes marked ignored (default none)
+        :param            trace: counts the nodes visited and subtrees abandoned (default None)
         :returns: a list of tuples containing (delta, node) where delta is the totat delta
-                    accumulated finding the match and node stores the word/phones for the match
+                    accumulated finding the match and node stores the word/phones for the match,
+                    sorted from best to worst match
+        """
+        search = PhoneticSearch(N, phonetic_multiplier, aoa_multiplier, budget, ignored_words, trace)
+        for c in self.root.children:
+            search.find_phonetic_match(self.root.children[c], unfinished_match.unmatched_phones, 0)
+        return [ (delta, node) for _, delta, node in sorted(search.n_best_list, key=lambda x: -x[0]) ]
+
+    def find_segment_matches(self, phones: str, N: int, phonetic_multiplier: float, word_cost: Callable[[PhoneNode],float], aoa_multiplier: Optional[float]=0.0, ignored_words: Optional[Set[str]]=frozenset()) -> Dict[int,List[Tuple[float,PhoneNode]]]:
+        """
+        Find the N lowest cost words for every prefix length of phones. A word covering the first
+        d phones costs the phonetic delta between its phones and phones[:d], compared phone by phone
+        like find_phonetic_match, times phonetic_multiplier plus word_cost(node).
+        Subtrees are abandoned once their phonetic cost plus lowest age of aquisition can't beat
+        the N best of any remaining length, which is exact as long as word_cost(node) is never
+        less than node.aoa * aoa_multiplier.
+
+        :param               phones: string of phones to be matched from the start
+        :param                    N: number of words to keep per prefix length
+        :param  phonetic_multiplier: multiplier applied to the phonetic delta
+        :param            word_cost: cost added for each word, eg. age of aquisition and semantics
+        :param       aoa_multiplier: multiplier of the age of aquisition included in word_cost (default 0.0)
+        :param        ignored_words: words that are never matched, on top of nodes marked ignored (default none)
+        :returns: a dict mapping prefix length to a list of up to N (cost, node) tuples sorted by cost
+        """
+        search = SegmentSearch(phones, N, phonetic_multiplier, word_cost, aoa_multiplier, ignored_words)
+        for c in self.root.children:
+            search.find_segment_matches(self.root.children[c], 1, 0)
+
+        segment_matches = {}
+        for length, segment_list in enumerate(search.segment_lists):
+            if segment_list:
+                segment_matches[length] = sorted([ (-neg_cost, node) for neg_cost, node in segment_list ], key=lambda x: x[0])
+        return segment_matches
+
+class PhoneticSearch:
+
+
+    def __init__(self, N: int, phonetic_multiplier: float, aoa_multiplier: float, budget: Optional[SearchBudget], ignored_words: Set[str], trace: Optional[SearchTrace]=None):
+        """
+        The running state of one PhoneTrie.find_phonetic_match call, kept out of the trie
+        so that one trie can be shared and searched by several threads at once
+
+        :param                   N: number of matches to keep
+        :param phonetic_multiplier: weight of the phonetic delta in the ranking
+        :param      aoa_multiplier: weight of the age of aquisition in the ranking
+        :param              budget: counts visited nodes, or None
+        :param       ignored_words: words that are never matched
+        :param               trace: counts the nodes visited and subtrees abandoned, or None
         """
-        self.n_best_list = []
+        self.n_best_list = [] # heap
         self.N = N
         self.max = -math.inf
-        for c in self.root.children:
-            self.__find_phonetic_match(self.root.children[c], unfinished_match.unmatched_phones, 0)
-        return self.n_best_list
+        self.phonetic_multiplier = phonetic_multiplier
+        self.aoa_multiplier = aoa_multiplier
+        self.budget = budget
+        self.ignored_words = ignored_words
+        self.trace = trace
+
+    def add_to_running_list(self, score_delta_and_node: Tuple[float,float,PhoneNode]):
+        """
+        For use with find_phonetic_match, adds a node, it's score and it's delta to the running
+        list of N best phonetic matches.
+
+        The N best list is done as a heap so the lowest scoring node can be removed
+        when the heap has more than N nodes
+        Also updates the self.max value so the search can abandon early words when
+        the score can't beat the lowest score in the full list
+
+        :param score_delta_and_node: (score, delta, node), a tuple containing the nodes score, delta and the node
+        """
+        node = score_delta_and_node[2]
+        if not node.ignored and node.word not in self.ignored_words:
+            if len(self.n_best_list) < self.N:
+                heapq.heappush(self.n_best_list, score_delta_and_node)
+            else:
+                heapq.heappushpop(self.n_best_list, score_delta_and_node)
+            if len(self.n_best_list) == self.N:
+                self.max = self.n_best_list[0][0]
 
-    def __find_phonetic_match(self, node: PhoneNode, phones: str, phonetic_delta: float):
+    def find_phonetic_match(self, node: PhoneNode, phones: str, phonetic_delta: float):
         """
         Recursively add all possible matches from the trie to the running N best match list,
-        updating the running phonetic delta along the way. Abandon early if match is more
-        dissimilar than all current matches in the list, as their children will be also
+        updating the running phonetic delta along the way. Abandon early if the best score
+        any word in the subtree could get is worse than all current matches in the list
 
         :param           node: Current node being added, and whose children will be added
         :param         phones: string of phones yet paired
         :param phonetic_delta: phonetic delta for the nodes prefix
         """
-        if not phones:
+        if not phones or (self.budget and not self.budget.visit_node()):
             return
+        if self.trace:
+            self.trace.nodes_visited += 1
+            self.trace.delta_calls += 1 # the delta of this node's phone
         phonetic_delta = phonetic_delta - aline.delta(phones[0], node.char)
-        if phonetic_delta > self.max: # stop searching if all children will we worse than existing matches
+        phonetic_score = phonetic_delta * self.phonetic_multiplier
+        if phonetic_score - node.min_aoa * self.aoa_multiplier > self.max: # stop searching if all children will we worse than existing matches
             if node.is_word:
                 temp = node
                 while temp: # add all the words with the same pronuciation
-                    self.__add_to_running_list((phonetic_delta, temp))
+                    self.add_to_running_list((phonetic_score - temp.aoa * self.aoa_multiplier, phonetic_delta, temp))
                     temp = temp.next
 
             for c in node.children:
-                self.__find_phonetic_match(node.children[c], phones[1:], phonetic_delta)
+                self.find_phonetic_match(node.children[c], phones[1:], phonetic_delta)
+        elif self.trace:
+            self.trace.pruned_subtrees += 1
+
+class SegmentSearch:
+
+
+    def __init__(self, phones: str, N: int, phonetic_multiplier: float, word_cost: Callable[[PhoneNode],float], aoa_multiplier: float, ignored_words: Set[str]):
+        """
+        The running state of one PhoneTrie.find_segment_matches call, kept out of the trie
+        so that one trie can be shared and searched by several threads at once
+
+        :param              phones: string of phones being matched
+        :param                   N: number of words to keep per prefix length
+        :param phonetic_multiplier: multiplier applied to the phonetic delta
+        :param           word_cost: cost added for each word
+        :param      aoa_multiplier: multiplier of the age of aquisition included in word_cost
+        :param       ignored_words: words that are never matched
+        """
+        self.phones = phones
+        self.segment_lists = [[] for _ in range(len(phones) + 1)] # heaps of (-cost, node) per length
+        self.N = N
+        self.phonetic_multiplier = phonetic_multiplier
+        self.word_cost = word_cost
+        self.aoa_multiplier = aoa_multiplier
+        self.ignored_words = ignored_words
 
+    def find_segment_matches(self, node: PhoneNode, depth: int, phonetic_delta: float):
+        """
+        Recursively add the words in node's subtree to the per length N best lists for find_segment_matches
+
+        :param           node: current node, covers phones[:depth]
+        :param          depth: number of phones covered by node
+        :param phonetic_delta: phonetic delta for the nodes prefix
+        """
+        phonetic_delta = phonetic_delta + aline.delta(self.phones[depth-1], node.char)
+        prefix_cost = phonetic_delta * self.phonetic_multiplier
+
+        # stop searching if every word in the subtree is worse than the existing matches of its length
+        worst = -math.inf
+        for segment_list in self.segment_lists[depth:]:
+            worst = max(worst, -segment_list[0][0] if len(segment_list) >= self.N else math.inf)
+        if prefix_cost + node.min_aoa * self.aoa_multiplier >= worst:
+            return
+
+        if node.is_word:
+            segment_list = self.segment_lists[depth]
+            temp = node
+            while temp: # add all the words with the same pronuciation
+                if not temp.ignored and temp.word not in self.ignored_words:
+                    cost = prefix_cost + self.word_cost(temp)
+                    if len(segment_list) < self.N:
+                        heapq.heappush(segment_list, (-cost, temp))
+                    elif cost < -segment_list[0][0]:
+                        heapq.heappushpop(segment_list, (-cost, temp))
+                temp = temp.next
+
+        if depth < len(self.phones):
+            for c in node.children:
+                self.find_segment_matches(node.children[c], depth + 1, phonetic_delta)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+class ResponseCache:
+
+
+    def __init__(self, max_size: Optional[int]=1024, ttl: Optional[float]=3600):
+        """
+        Thread safe in-process cache of responses. Holds at most max_size entries, evicting the
+        least recently used one when full, and an entry expires ttl seconds after it was added.
+        Counts hits and misses so the hit rate can be monitored.
+
+        :param max_size: max number of entries (default 1024)
+        :param      ttl: seconds an entry is kept, None keeps entries until they're evicted (default 3600)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict() # key -> (expiry time, value), least recently used first
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any=None) -> Any:
+        """
+        Return the value cached for key, or default when there is none or it has expired
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        """
+        Cache value for key, evicting the least recently used entry if the cache is full
+        """
+        expiry = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.entries[key] = (expiry, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def hit_rate(self) -> float:
+        """
+        Return the fraction of lookups that were hits, 0 before the first lookup
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        """
+        Return the cache's size, hits, misses and hit rate
+        """
+        hit_rate = self.hit_rate()
+        with self.lock:
+            return {'size': len(self.entries), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses, 'hit_rate': hit_rate}
@@ -0,0 +1,62 @@
+import time
+from typing import Optional
+
+class SearchBudget:
+
+
+    def __init__(self, time_limit: Optional[float]=None, max_nodes: Optional[int]=None, max_rounds: Optional[int]=None):
+        """
+        Limits how much work a mnemonic search may do. Pass it to WWUTransphoner.get_mnemonics,
+        once any limit is reached the search stops and returns the best finished matches found
+        so far, and budget.exhausted is set to show the result is partial.
+        A budget is restarted by every search it is passed to, so it can be reused.
+
+        :param time_limit: seconds the search may run for (default None, no limit)
+        :param  max_nodes: max number of trie nodes the search may visit (default None, no limit)
+        :param max_rounds: max number of beam rounds (default None, no limit)
+        """
+        self.time_limit = time_limit
+        self.max_nodes = max_nodes
+        self.max_rounds = max_rounds
+        self.start()
+
+    def start(self):
+        """
+        Reset the counters and start the clock for a new search
+        """
+        self.deadline = None if self.time_limit is None else time.monotonic() + self.time_limit
+        self.nodes_visited = 0
+        self.rounds = 0
+        self.exhausted = False
+
+    def is_exhausted(self) -> bool:
+        """
+        Return if any limit of the budget has been reached
+        """
+        if not self.exhausted and self.deadline is not None and time.monotonic() > self.deadline:
+            self.exhausted = True
+        return self.exhausted
+
+    def visit_node(self) -> bool:
+        """
+        Count a visited trie node, the clock is only checked every 256 nodes to keep it cheap
+
+        :returns: true if the search may continue
+        """
+        self.nodes_visited += 1
+        if self.max_nodes is not None and self.nodes_visited > self.max_nodes:
+            self.exhausted = True
+        elif self.nodes_visited % 256 == 0:
+            self.is_exhausted()
+        return not self.exhausted
+
+    def next_round(self) -> bool:
+        """
+        Count a new beam round
+
+        :returns: true if the search may continue
+        """
+        self.rounds += 1
+        if self.max_rounds is not None and self.rounds > self.max_rounds:
+            self.exhausted = True
+        return not self.is_exhausted()
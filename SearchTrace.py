@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+
+import aline
+
+class SearchTrace:
+
+
+    def __init__(self):
+        """
+        Counts the work a mnemonic search does, to find the inputs that make it slow and to check
+        optimizations really do less work. Pass it to WWUTransphoner.get_mnemonics and read the
+        counters once it returns, counters are reset by every search it is passed to.
+        A traced call always runs its own search, rather than sharing an identical call's.
+        """
+        self.start()
+
+    def start(self):
+        """
+        Reset the counters for a new search
+        """
+        self.stored = False # the mnemonics were looked up in the store, nothing was searched
+        self.rounds = 0 # beam rounds
+        self.trie_searches = 0 # find_phonetic_match calls, matches with the same unmatched phones share one
+        self.nodes_visited = 0 # trie nodes visited by the trie searches
+        self.pruned_subtrees = 0 # subtrees abandoned since none of their words could make the N best
+        self.delta_calls = 0 # aline.delta calls, one per trie node visited plus those of the alignments computed
+        self.align_calls = 0 # alignments of a match's phones against the input's, cached ones included
+        self.semantic_lookups = 0 # semantic distances computed, each word's is only computed once
+        self.expansions = 0 # matches extended by a word
+        self.discarded = 0 # unfinished paths dropped for not being among the N best of their round
+
+    @contextmanager
+    def counting_alignment(self):
+        """
+        Count the aline.delta calls the alignment inside the with block makes, none when it's
+        cached. Read from aline.delta's cache statistics so untraced alignments don't pay for
+        counting, calls other threads make meanwhile are counted too
+        """
+        before = aline.delta.cache_info()
+        try:
+            yield
+        finally:
+            after = aline.delta.cache_info()
+            self.delta_calls += after.hits + after.misses - before.hits - before.misses
+
+    def counters(self) -> dict:
+        """
+        Return every counter by name
+        """
+        return dict(vars(self))
@@ -0,0 +1,128 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    from WWUTransphoner import WWUTransphoner
+
+import queue
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+# A pending gen_sentences call, future gets the sentences for mnemonics once its batch is done
+SentenceRequest = namedtuple('SentenceRequest', ['mnemonics', 'mask_predict_passes', 'future'])
+
+class SentenceBatcher:
+
+
+    def __init__(self, transphoner: WWUTransphoner, max_wait: Optional[float]=0.005, max_batch_size: Optional[int]=32):
+        """
+        Generates sentences for concurrent callers in shared batches. A worker thread waits up
+        to max_wait seconds after the first pending call for more calls to arrive, then runs
+        them all through one transphoner.gen_sentences call and hands each caller its sentences.
+        Identical calls made while one is pending or generating share its sentences.
+
+        :param    transphoner: transphoner with output language 'en' used to generate the sentences
+        :param       max_wait: max seconds a call waits for others to join its batch (default 0.005)
+        :param max_batch_size: number of mnemonics at which a batch runs without waiting longer, and the
+                               most gen_sentences is called with at once (default 32)
+        """
+        self.transphoner = transphoner
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self.requests = queue.Queue()
+        self.pending = {} # (mnemonics, mask_predict_passes) -> Future of calls not done yet
+        self.lock = threading.Lock()
+        self.worker = threading.Thread(target=self.__run, name='SentenceBatcher', daemon=True)
+        self.worker.start()
+
+    def gen_sentences(self, input_mnemonics: List[str], mask_predict_passes: Optional[int]=None) -> List[str]:
+        """
+        Return a list of mnemonic sentences, one sentence per mnemonic in input_mnemonics, the
+        same as WWUTransphoner.gen_sentences but generated in a batch with other callers
+
+        :param     input_mnemonics: a list of mnemonics (strings)
+        :param mask_predict_passes: see WWUTransphoner.gen_sentences, only calls with the same value share a batch
+        :returns                  : a list of sentences built around the mnemonics in input_mnemonics
+        """
+        return self.submit(input_mnemonics, mask_predict_passes).result()
+
+    def submit(self, input_mnemonics: List[str], mask_predict_passes: Optional[int]=None) -> Future:
+        """
+        Queue the sentences for input_mnemonics and return right away, see gen_sentences
+
+        :param     input_mnemonics: a list of mnemonics (strings)
+        :param mask_predict_passes: see WWUTransphoner.gen_sentences
+        :returns                  : a Future that gets the list of sentences once they are generated
+        """
+        if not input_mnemonics:
+            future = Future()
+            future.set_result([])
+            return future
+
+        key = (tuple(input_mnemonics), mask_predict_passes)
+        with self.lock:
+            future = self.pending.get(key)
+            if future is not None:
+                return future
+            future = Future()
+            self.pending[key] = future
+        future.add_done_callback(lambda _: self.__forget(key))
+        self.requests.put(SentenceRequest(list(input_mnemonics), mask_predict_passes, future))
+        return future
+
+    def __forget(self, key: Tuple[Tuple[str,...],Optional[int]]):
+        """
+        Remove a done call, so later identical calls get new sentences
+        """
+        with self.lock:
+            del self.pending[key]
+
+    def __run(self):
+        """
+        Worker loop, collects pending calls into batches and runs them
+        """
+        while True:
+            batch = [self.requests.get()]
+            batch_size = len(batch[0].mnemonics)
+            deadline = time.monotonic() + self.max_wait
+            while batch_size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                batch_size += len(request.mnemonics)
+            self.__run_batch(batch)
+
+    def __run_batch(self, batch: List[SentenceRequest]):
+        """
+        Generate the sentences for a batch of calls and hand each call its results,
+        calls with different mask_predict_passes are generated separately and the mnemonics
+        are generated max_batch_size at a time, so one large call can't run out of memory
+
+        :param batch: the pending calls to run
+        """
+        groups = {}
+        for request in batch:
+            groups.setdefault(request.mask_predict_passes, []).append(request)
+
+        for mask_predict_passes, requests in groups.items():
+            # a mnemonic several calls ask for is only generated once, and they share its sentence
+            mnemonics = list(dict.fromkeys([ mnemonic for request in requests for mnemonic in request.mnemonics ]))
+            try:
+                sentences = {}
+                for start in range(0, len(mnemonics), self.max_batch_size):
+                    chunk = mnemonics[start:start + self.max_batch_size]
+                    sentences.update(zip(chunk, self.transphoner.gen_sentences(chunk, mask_predict_passes)))
+            except Exception as error:
+                for request in requests:
+                    request.future.set_exception(error)
+                continue
+
+            for request in requests:
+                request.future.set_result([ sentences[mnemonic] for mnemonic in request.mnemonics ])
@@ -0,0 +1,22 @@
+import torch
+from transformers import StoppingCriteria
+
+class SentenceEndCriteria(StoppingCriteria):
+
+
+    def __init__(self, sentence_end_ids: torch.Tensor):
+        """
+        Stops a batched generate call once every sequence has generated a sentence ending token.
+        Sequences that ended earlier keep generating until then, what follows their sentence end
+        is cut off by WWUTransphoner.trim_to_one_sentence.
+        A criteria is only used for one generate call since it remembers the sequences that ended.
+
+        :param sentence_end_ids: ids of the tokens that end a sentence
+        """
+        self.sentence_end_ids = sentence_end_ids
+        self.ended = None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> bool:
+        ended = torch.isin(input_ids[:, -1], self.sentence_end_ids)
+        self.ended = ended if self.ended is None else self.ended | ended
+        return bool(self.ended.all())
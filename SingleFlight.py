@@ -0,0 +1,165 @@
+import threading
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional, Tuple
+
+class Flight:
+
+
+    def __init__(self, context: Any):
+        """
+        A computation in flight, holds what it produced so far for every caller waiting on it
+
+        :param context: whatever the caller that started the computation passed along, eg. its budget
+        """
+        self.context = context
+        self.followers = 0 # calls sharing the computation besides the one that started it
+        self.items = []
+        self.error = None
+        self.done = False
+        self.condition = threading.Condition()
+
+    def add(self, item: Any):
+        """
+        Hand a produced item to the waiting callers
+        """
+        with self.condition:
+            self.items.append(item)
+            self.condition.notify_all()
+
+    def finish(self, error: Optional[BaseException]=None):
+        """
+        Mark the computation finished, error is raised for every waiting caller
+        """
+        with self.condition:
+            self.error = error
+            self.done = True
+            self.condition.notify_all()
+
+    def follow(self) -> Iterator[Any]:
+        """
+        Yield every item the computation produces, as they are produced
+        """
+        i = 0
+        while True:
+            with self.condition:
+                while i >= len(self.items) and not self.done:
+                    self.condition.wait()
+                items = self.items[i:]
+                done = self.done
+            yield from items
+            i += len(items)
+            if done and i >= len(self.items):
+                if self.error:
+                    raise self.error
+                return
+
+class SingleFlight:
+
+
+    def __init__(self):
+        """
+        Coalesces identical concurrent calls: the first call for a key runs the computation and
+        every call with the same key made while it runs waits for it and shares its result,
+        instead of running the same computation again. Nothing is kept once a computation is done.
+        """
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable[[],Any], context: Any=None) -> Tuple[Any,Any]:
+        """
+        Return fn(), or the result of the fn() already running for key, exceptions are shared too
+
+        :param     key: identifies identical calls
+        :param      fn: the computation
+        :param context: kept with the computation when this call starts it
+        :returns      : (the result, the context of the call that started the computation)
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = Flight(context)
+                self.flights[key] = flight
+            else:
+                flight.followers += 1
+
+        if leader:
+            try:
+                flight.add(fn())
+                flight.finish()
+            except BaseException as error:
+                flight.finish(error)
+                raise
+            finally:
+                with self.lock:
+                    del self.flights[key]
+        return next(flight.follow()), flight.context
+
+    def iterate(self, key: Hashable, fn: Callable[[],Iterable[Any]], context: Any=None) -> Tuple[Iterator[Any],Any]:
+        """
+        Return an iterator over fn(), or over the fn() already running for key. The call that
+        starts the computation runs it as it iterates, and the other callers get each item once
+        it has. If it stops iterating while others are following, the rest of the computation
+        moves to its own thread so it finishes for them.
+
+        :param     key: identifies identical calls
+        :param      fn: the computation, returns an iterable
+        :param context: kept with the computation when this call starts it
+        :returns      : (an iterator over the items, the context of the call that started the computation)
+        """
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is None:
+                flight = Flight(context)
+                self.flights[key] = flight
+                return self.__lead(key, flight, fn), context
+            flight.followers += 1
+        return flight.follow(), flight.context
+
+    def __lead(self, key: Hashable, flight: Flight, fn: Callable[[],Iterable[Any]]) -> Iterator[Any]:
+        """
+        Run an iterate computation for the call that started it, yielding its items and handing them to the flight
+        """
+        items = iter(fn())
+        while True:
+            try:
+                item = next(items)
+            except StopIteration:
+                self.__land(key, flight)
+                return
+            except BaseException as error:
+                self.__land(key, flight, error)
+                raise
+            flight.add(item)
+            try:
+                yield item
+            except GeneratorExit: # the caller stopped iterating
+                with self.lock:
+                    followed = flight.followers > 0
+                    if not followed:
+                        del self.flights[key]
+                if followed:
+                    threading.Thread(target=self.__run, args=(key, flight, items), name='SingleFlight', daemon=True).start()
+                else:
+                    flight.finish()
+                raise
+
+    def __run(self, key: Hashable, flight: Flight, items: Iterator[Any]):
+        """
+        Finish an iterate computation its caller stopped iterating, handing its items to the flight
+        """
+        error = None
+        try:
+            for item in items:
+                flight.add(item)
+        except BaseException as e:
+            error = e
+        finally:
+            self.__land(key, flight, error)
+
+    def __land(self, key: Hashable, flight: Flight, error: Optional[BaseException]=None):
+        """
+        Remove a finished computation, so later calls start a new one, and release its followers
+        """
+        with self.lock:
+            del self.flights[key]
+        flight.finish(error)
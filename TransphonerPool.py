@@ -0,0 +1,92 @@
+import gc
+import threading
+import MatchList
+from SentenceBatcher import SentenceBatcher
+from WWUTransphoner import WWUTransphoner
+from typing import Dict, List, Optional, Tuple
+
+class TransphonerPool:
+
+
+    def __init__(self, store: Optional[str]=None, sentence_batch_wait: Optional[float]=0.005, sentence_batch_size: Optional[int]=32, quantized: Optional[bool]=False):
+        """
+        Keeps one WWUTransphoner per (input language, output language) pair, built the first time
+        the pair is asked for, so threads serving different language pairs never replace each
+        other's transphoner. Transphoners share their tries, see PhoneTrie.shared_trie.
+        Sentences for every pair go through one SentenceBatcher, so the models are only loaded once.
+
+        :param               store: path of a MnemonicStore the transphoners look mnemonics up in (default None)
+        :param sentence_batch_wait: see SentenceBatcher's max_wait (default 0.005)
+        :param sentence_batch_size: see SentenceBatcher's max_batch_size (default 32)
+        :param           quantized: build the transphoners with int8 quantized sentence generation models (default False)
+        """
+        self.store = store
+        self.sentence_batch_wait = sentence_batch_wait
+        self.sentence_batch_size = sentence_batch_size
+        self.quantized = quantized
+        self.transphoners: Dict[Tuple[str,str],WWUTransphoner] = {}
+        self.sentence_batcher: Optional[SentenceBatcher] = None
+        self.lock = threading.Lock()
+        self.pair_locks = {}
+
+    def is_loaded(self, input_language: str, output_language: str) -> bool:
+        """
+        Return whether the transphoner for the language pair is already built
+        """
+        return (input_language, output_language) in self.transphoners
+
+    def get(self, input_language: str, output_language: str) -> WWUTransphoner:
+        """
+        Return the transphoner for the language pair, building it on the first call
+
+        :param  input_language: the language of the input words
+        :param output_language: the language of the mnemonics
+        :raises     ValueError: raises value error when a language is not supported
+        """
+        pair = (input_language, output_language)
+        transphoner = self.transphoners.get(pair)
+        if transphoner is None:
+            with self.lock:
+                pair_lock = self.pair_locks.setdefault(pair, threading.Lock())
+            with pair_lock: # other pairs can be built at the same time
+                transphoner = self.transphoners.get(pair)
+                if transphoner is None:
+                    transphoner = WWUTransphoner(input_language, output_language, quantized=self.quantized, store=self.store)
+                    self.transphoners[pair] = transphoner
+        return transphoner
+
+    def preload(self, pairs: List[Tuple[str,str]]):
+        """
+        Build the transphoners for the language pairs and load everything otherwise loaded on first
+        use: the tries, the word embeddings, nltk and, when a pair outputs english, the sentence
+        generation models of the 'en' to 'en' transphoner the SentenceBatcher uses, so a server
+        that forks its workers afterwards (eg. gunicorn --preload) shares them copy-on-write.
+        Everything loaded is then frozen out of the garbage collector, which keeps the workers'
+        collections from writing to those objects. Their reference counts still change when a
+        worker uses them, copying those pages, so mostly the data of the large arrays and tensors,
+        which isn't made of Python objects, stays shared.
+        The SentenceBatcher isn't started since threads don't survive a fork.
+
+        :param pairs: (input language, output language) pairs to load
+        :raises ValueError: raises value error when a language is not supported
+        """
+        for input_language, output_language in pairs:
+            self.get(input_language, output_language)
+        MatchList.load_embeddings()
+        import nltk # only imported once a match is finished otherwise
+        if any([ output_language == 'en' for _, output_language in pairs ]):
+            self.get('en', 'en').warmup()
+        gc.collect()
+        gc.freeze()
+
+    def get_sentence_batcher(self) -> SentenceBatcher:
+        """
+        Return the SentenceBatcher generating the sentences for every language pair, sentence
+        generation doesn't depend on the input language so the 'en' to 'en' transphoner is used
+        """
+        if self.sentence_batcher is None:
+            transphoner = self.get('en', 'en')
+            with self.lock:
+                if self.sentence_batcher is None:
+                    self.sentence_batcher = SentenceBatcher(transphoner, self.sentence_batch_wait, self.sentence_batch_size)
+        return self.sentence_batcher
@@ -1,22 +1,22 @@
 import random
-import copy
+import heapq
+import math
 import os
-from datetime import datetime
-from gensim import models
-from gensim.models import KeyedVectors
-import torch
-from transformers import OpenAIGPTTokenizer, OpenAIGPTLMHeadModel, BertTokenizer, BertForMaskedLM
-from torch.nn import functional
-from happytransformer import HappyWordPrediction
+import threading
 import MatchList
-from PhoneTrie import PhoneTrie
-from typing import Optional, List, Union, Tuple
+from LatencyMetrics import metrics
+from MnemonicStore import MnemonicStore
+from PhoneTrie import PhoneTrie, PhoneNode, shared_trie
+from SearchBudget import SearchBudget
+from SearchTrace import SearchTrace
+from SingleFlight import SingleFlight
+from typing import Iterator, Optional, List, Union, Tuple
 
 class WWUTransphoner:
 
     supported_languages = {'en', 'ja', 'de', 'fr', 'zh'}
 
-    def __init__(self, input_language: str, output_language: str):
+    def __init__(self, input_language: str, output_language: str, quantized: Optional[bool]=False, store: Optional[Union[str,MnemonicStore]]=None):
         """
         The WWUTransphoner provides the functionality of taking in a word in one language,
         and outputting a short mnemonic phrase for use in second language vocabulary memorization
@@ -31,7 +31,13 @@ class WWUTransphoner:
 
         :param  input_language: the language correspoding to the potential input words
         :param output_language: language for outputing mnemonics in
+        :param       quantized: use int8 quantized sentence generation models, faster and smaller on CPU (default False)
+        :param           store: MnemonicStore, or the path of one, with precomputed mnemonics that are
+                                looked up before searching, see precompute_mnemonics.py (default None)
         :raises     ValueError: raises value error when provided input/output language not supported
+
+        The sentence generation models are only loaded the first time gen_sentences is called,
+        servers can call warmup to load everything up front.
         """
 
         if input_language not in WWUTransphoner.supported_languages:
@@ -39,26 +45,55 @@ class WWUTransphoner:
         elif output_language not in WWUTransphoner.supported_languages:
             raise ValueError("\"" + input_language + "\"", "not in supported languages:", WWUTransphoner.supported_languages)
         else:
-            self.target_trie = PhoneTrie(output_language)
-            self.input_trie = PhoneTrie(input_language)
+            self.target_trie = shared_trie(output_language)
+            self.input_trie = shared_trie(input_language)
+            self.ignored_words = set()
+            self.store = MnemonicStore(store) if isinstance(store, str) else store
+            self.flights = SingleFlight() # identical calls running at the same time share one computation
 
-            # only can produce sentences for english
-            if output_language == 'en':
-                self.load_models()
+            self.quantized = quantized
+            self.models_loaded = False
+            self.models_lock = threading.Lock()
 
             self.input_language = input_language
             self.output_language = output_language
 
+    def warmup(self):
+        """
+        Load everything that is otherwise loaded on first use: the word embeddings, nltk,
+        and the sentence generation models when the output language is english
+        """
+        MatchList.load_embeddings()
+        import nltk # only imported once a match is finished otherwise
+        if self.output_language == 'en':
+            self.load_models()
+
     def load_models(self):
         """
         Loads the models from the local directory, if first time running
-        on the machine it will procure the models
+        on the machine it will procure the models.
+        Does nothing if the models are already loaded.
+        When the transphoner is quantized GPT and BERT have their linear layers quantized to
+        int8, the quantized weights are cached in the models directory the first time
+        """
+        with self.models_lock:
+            if not self.models_loaded:
+                self.__load_models()
+                self.models_loaded = True
+
+    def __load_models(self):
         """
+        Loads the models, see load_models
+        """
+        import torch
+        from transformers import OpenAIGPTTokenizer, OpenAIGPTLMHeadModel, BertTokenizer, BertForMaskedLM
+
         if os.path.isdir('models'):
             self.gpt_tokenizer = OpenAIGPTTokenizer.from_pretrained('models/GPTTokenizer')
-            self.gpt_model = OpenAIGPTLMHeadModel.from_pretrained('models/GPTModel')
             self.bert_tokenizer = BertTokenizer.from_pretrained('models/BertTokenizer')
-            self.bert_model = BertForMaskedLM.from_pretrained('models/BertModel', return_dict = True)
+            if not self.quantized:
+                self.gpt_model = OpenAIGPTLMHeadModel.from_pretrained('models/GPTModel')
+                self.bert_model = BertForMaskedLM.from_pretrained('models/BertModel', return_dict = True)
         else:
             self.gpt_tokenizer = OpenAIGPTTokenizer.from_pretrained('openai-gpt')
             self.gpt_model = OpenAIGPTLMHeadModel.from_pretrained('openai-gpt')
@@ -69,6 +104,20 @@ class WWUTransphoner:
             self.bert_tokenizer.save_pretrained('models/BertTokenizer')
             self.bert_model.save_pretrained('models/BertModel')
 
+        if self.quantized:
+            import quantization # only quantized transphoners need torch.quantization
+            self.gpt_model = quantization.load_quantized(OpenAIGPTLMHeadModel, 'models/GPTModel', 'models/GPTModel-int8.pt')
+            self.bert_model = quantization.load_quantized(BertForMaskedLM, 'models/BertModel', 'models/BertModel-int8.pt', return_dict = True)
+
+        # tokens that end a sentence, generating a sentence end stops once every sequence has one
+        self.gpt_sentence_end_ids = torch.tensor([ id for token, id in self.gpt_tokenizer.get_vocab().items() if any(p in token for p in ['.', '!', '?']) ])
+
+        # tokens mask predict never uses for a new word: special tokens, quotes and word pieces
+        self.bert_banned_ids = torch.tensor(
+            self.bert_tokenizer.all_special_ids
+            + self.bert_tokenizer.convert_tokens_to_ids(['"', '\''])
+            + [ id for token, id in self.bert_tokenizer.get_vocab().items() if token.startswith('##') ])
+
     def set_multipliers(self, imageability: Optional[float]=1.0, orthographic: Optional[float]=1, phonetic: Optional[float]=1.0, semantic: Optional[float]=50):
         """
         Update the multipliers that are used when computing how similar a mnemonic is
@@ -86,14 +135,21 @@ class WWUTransphoner:
 
 
 
-    def get_mnemonics(self, input_word: str, translation: Optional[str] = None, N: Optional[int]=5, include_phones: Optional[bool]=False) -> Union[List[str],Tuple[List[str],List[str],str]]:
+    def get_mnemonics(self, input_word: str, translation: Optional[str] = None, N: Optional[int]=5, include_phones: Optional[bool]=False, budget: Optional[SearchBudget]=None, weights: Optional[MatchList.Weights]=None, trace: Optional[SearchTrace]=None) -> Union[List[str],Tuple[List[str],List[str],str]]:
         """
-        Return a list of mnemonics similar to the input word
+        Return a list of mnemonics similar to the input word.
+        Identical calls made while one is searching wait for it and share its mnemonics,
+        except traced calls, which always run a search of their own so the trace counts it.
 
         :param       input_word: the input word for which to return mnemonics
         :param      translation: translation for the input word (optional), (default None)
         :param                N: number of mnemonics to return (default 5)
         :param   include-phones: whether to output phonetic information
+        :param           budget: limits on the search time and work (optional), when reached the
+                                 best mnemonics finished so far are returned and budget.exhausted is set
+        :param          weights: multipliers to score mnemonics with (default the current MatchList multipliers),
+                                 unlike set_multipliers this only affects this call
+        :param            trace: counts the work the search does (optional), see SearchTrace
         :returns               : a list of N mnemonic phrases
                             or : (a list of N mnemonic phrases,
                                   a list of corresponding phonetic data,
@@ -101,48 +157,391 @@ class WWUTransphoner:
         :raises    KeyError: raises when the input word's phones are not in the dictionary
         """
 
-        old_N = N
-        N = max(N, 5)
+        if budget:
+            budget.start()
+        weights = weights or MatchList.current_weights()
+        search = lambda: self.__get_mnemonics(input_word, translation, N, include_phones, budget, weights, trace)
+        if trace: # a traced call runs its own search so the counters are its own
+            trace.start()
+            return search()
+
+        key = ('get_mnemonics', input_word.lower(), translation, N, include_phones, weights)
+        mnemonics, search_budget = self.flights.do(key, search, budget)
+        WWUTransphoner.share_budget(budget, search_budget)
+        return mnemonics
+
+    def __get_mnemonics(self, input_word: str, translation: Optional[str], N: int, include_phones: bool, budget: Optional[SearchBudget], weights: MatchList.Weights, trace: Optional[SearchTrace]) -> Union[List[str],Tuple[List[str],List[str],str]]:
+        """
+        Return the mnemonics for get_mnemonics, see get_mnemonics
+        """
+        stored = self.__stored_mnemonics(input_word, translation, N, weights)
+        if stored is not None:
+            if trace:
+                trace.stored = True
+            if include_phones:
+                return [ words for words, _, _ in stored ], [ phones for _, phones, _ in stored ], stored[0][2]
+            else:
+                return [ words for words, _, _ in stored ]
+
+        with metrics.time('search'):
+            input_node = self.input_trie.search(input_word.lower())
+        if not input_node:
+            raise KeyError("Can't find phones for input word:", input_word)
+
+        matches = list(self.__iter_matches(input_node, translation, N, budget, weights, trace))
+
+        if include_phones:
+            words = [ match.matched_words for match in matches ]
+            phones = [ "/" + match.matched_phones_raw.strip() + "/" for match in matches ]
+            return words, phones, "/" + input_node.phones_raw + "/"
+        else:
+            return [ match.matched_words for match in matches ]
 
-        input_node = self.input_trie.search(input_word.lower())
+    def iter_mnemonics(self, input_word: str, translation: Optional[str] = None, N: Optional[int]=5, budget: Optional[SearchBudget]=None, weights: Optional[MatchList.Weights]=None, trace: Optional[SearchTrace]=None) -> Iterator[Tuple[str,str,str]]:
+        """
+        Yield the mnemonics get_mnemonics would return, in the same order, each one as soon as
+        no match still being searched can beat it, so the first results are available before
+        the search finishes. Nothing is yielded early if a multiplier is negative.
+        Identical calls made while one is searching follow along with its search, except
+        traced calls, which always run a search of their own so the trace counts it.
+
+        :param       input_word: the input word for which to yield mnemonics
+        :param      translation: translation for the input word (optional), (default None)
+        :param                N: number of mnemonics to yield (default 5)
+        :param           budget: limits on the search time and work (optional), see get_mnemonics
+        :param          weights: multipliers to score mnemonics with (optional), see get_mnemonics
+        :param            trace: counts the work the search does (optional), see SearchTrace
+        :yields                : (a mnemonic phrase,
+                                  its phonetic data,
+                                  the phonetic data of the input phrase)
+        :raises    KeyError: raises on the first next() when the input word's phones are not in the dictionary
+        """
+
+        if budget:
+            budget.start()
+        weights = weights or MatchList.current_weights()
+        if trace: # a traced call runs its own search so the counters are its own
+            trace.start()
+            yield from self.__iter_mnemonics(input_word, translation, N, budget, weights, trace)
+            return
+
+        key = ('iter_mnemonics', input_word.lower(), translation, N, weights)
+        mnemonics, search_budget = self.flights.iterate(key, lambda: self.__iter_mnemonics(input_word, translation, N, budget, weights), budget)
+        yield from mnemonics
+        WWUTransphoner.share_budget(budget, search_budget)
+
+    def share_budget(budget: Optional[SearchBudget], search_budget: Optional[SearchBudget]):
+        """
+        When a call shared the search of an identical call, mark its budget exhausted if the
+        budget of the search was
+
+        :param        budget: the budget of the call
+        :param search_budget: the budget the search ran with
+        """
+        if budget and search_budget is not budget:
+            budget.exhausted = bool(search_budget and search_budget.exhausted)
+
+    def __iter_mnemonics(self, input_word: str, translation: Optional[str], N: int, budget: Optional[SearchBudget], weights: MatchList.Weights, trace: Optional[SearchTrace]=None) -> Iterator[Tuple[str,str,str]]:
+        """
+        Yield the mnemonics for iter_mnemonics, see iter_mnemonics
+        """
+        stored = self.__stored_mnemonics(input_word, translation, N, weights)
+        if stored is not None:
+            if trace:
+                trace.stored = True
+            yield from stored
+            return
+
+        with metrics.time('search'):
+            input_node = self.input_trie.search(input_word.lower())
         if not input_node:
             raise KeyError("Can't find phones for input word:", input_word)
 
-        starting_match = MatchList.Match(input_node, translation)
+        input_phones = "/" + input_node.phones_raw + "/"
+        for match in self.__iter_matches(input_node, translation, N, budget, weights, trace):
+            yield match.matched_words, "/" + match.matched_phones_raw.strip() + "/", input_phones
+
+    def __stored_mnemonics(self, input_word: str, translation: Optional[str], N: int, weights: MatchList.Weights) -> Optional[List[Tuple[str,str,str]]]:
+        """
+        Return the precomputed mnemonics of input_word from the store, or None when they have to be
+        searched for: there's no store, the word isn't stored, a translation was given or words are ignored.
+        Words stored without any mnemonics are searched again so the input phones can be returned.
+
+        :param  input_word: the input word
+        :param translation: translation for the input word, or None
+        :param           N: number of mnemonics wanted
+        :param     weights: multipliers the mnemonics are scored with
+        :returns          : a list of (a mnemonic phrase, its phonetic data, the phonetic data of the input phrase)
+        """
+        if not self.store or translation or self.ignored_words:
+            return None
+        return self.store.get(self.input_language, self.output_language, input_word.lower(), N, weights) or None
+
+    def __iter_matches(self, input_node: PhoneNode, translation: Optional[str], N: int, budget: Optional[SearchBudget], weights: MatchList.Weights, trace: Optional[SearchTrace]=None) -> Iterator[MatchList.Match]:
+        """
+        Run the beam search for mnemonics of input_node, yielding the N best finished matches
+        in order. Matches only get worse as words are added, so once a finished match is no
+        worse than every match still being searched it is final and is yielded right away.
+
+        :param  input_node: node of the input word in the input trie
+        :param translation: translation for the input word, or None
+        :param           N: number of matches to yield
+        :param      budget: limits on the search time and work, or None
+        :param     weights: multipliers to score the matches with
+        :param       trace: counts the work the search does, or None
+        """
+
+        old_N = N
+        N = max(N, 5)
+
+        # with a negative multiplier matches can improve, so none are final until the end
+        monotonic = min(weights) >= 0
+        num_yielded = 0
+
+        starting_match = MatchList.Match(input_node, translation, weights=weights, trace=trace)
         match_list = MatchList.MatchList()
         match_list.add_match(starting_match)
 
+        # phonetic matches only depend on the unmatched phones, so every match with the
+        # same unmatched phones shares one trie search
+        phonetic_matches = {}
+
+        search_round = 0
         working_matches = match_list.remove_and_retrieve_unfinished_matches(N)
         while working_matches:
-            for match in working_matches:
-                potential_matches = self.target_trie.find_phonetic_match(match, N)
-                if potential_matches: # sometimes a match wont find anything to match
-                    for i in range(0, min(N, len(potential_matches))):
-                        new_match = copy.deepcopy(match)
-                        new_match.add_new_matched_phones(potential_matches[i][1], -potential_matches[i][0])
-                        match_list.add_match(new_match)
-                else:
-                    match.search_failed = True
-                    match.is_fully_matched = True
-                    match_list.add_match(match)
+            if budget and not budget.next_round():
+                break
+
+            lowest_delta = min([ match.delta for match in working_matches ]) if monotonic else -math.inf
+            for match in match_list.get_finished_matches(old_N)[num_yielded:]:
+                if match.delta > lowest_delta:
+                    break
+                num_yielded += 1
+                yield match
+
+            search_round += 1
+            extensions = {} # id of match -> the match extended by each phonetic match, its alternates are extended like it
+            for match, alternate in MatchList.get_paths(working_matches):
+                if match.unmatched_phones not in phonetic_matches:
+                    with metrics.time('find_phonetic_match'):
+                        phonetic_matches[match.unmatched_phones] = self.target_trie.find_phonetic_match(match, N, weights.phonetic, weights.aoa, budget, self.ignored_words, trace)
+                    if trace:
+                        trace.trie_searches += 1
+                if budget and budget.exhausted: # matches from an unfinished trie search aren't the best ones
+                    break
+                self.__extend_match(match_list, match, alternate, phonetic_matches[match.unmatched_phones], N, extensions, trace)
             working_matches = match_list.remove_and_retrieve_unfinished_matches(N)
+            if trace:
+                trace.rounds = search_round
+                trace.discarded = match_list.num_discarded
+
+        for match in match_list.get_finished_matches(old_N)[num_yielded:]:
+            yield match
+
+    def __extend_match(self, match_list: MatchList.MatchList, match: MatchList.Match, alternate: Optional[MatchList.Alternate], potential_matches: List[Tuple[float,PhoneNode]], N: int, extensions: dict, trace: Optional[SearchTrace]=None):
+        """
+        Add the path, extended by each of the N best potential matches, to match_list. Only a match's
+        own path is extended with extend, its alternates reuse the alignments of its extensions,
+        so the paths are added in the order MatchList.get_paths returns them.
+
+        :param        match_list: the beam's match list
+        :param             match: a working match
+        :param         alternate: the path of match to extend, one of its alternates or None for its own
+        :param potential_matches: (delta, node) phonetic matches for match's unmatched phones
+        :param                 N: number of potential matches to extend the path with
+        :param        extensions: id of match -> match's extensions, filled in when its own path is extended
+        :param             trace: counts the expansions, or None
+        """
+        if potential_matches: # sometimes a match wont find anything to match
+            if trace:
+                trace.expansions += min(N, len(potential_matches))
+            if alternate is None:
+                extensions[id(match)] = []
+                for i in range(0, min(N, len(potential_matches))):
+                    extensions[id(match)].append(match.extend(potential_matches[i][1], -potential_matches[i][0]))
+                    match_list.add_match(extensions[id(match)][-1])
+            else:
+                for extended, (delta, node) in zip(extensions[id(match)], potential_matches):
+                    match_list.add_alternate(extended, match.extend_alternate(alternate, node, -delta, extended))
+        elif alternate is None:
+            match.search_failed = True
+            match.is_fully_matched = True
+            match.alternates = []
+            match_list.add_match(match)
+        else:
+            match_list.add_alternate(match, alternate)
+
+    def get_mnemonics_batch(self, input_words: List[str], translations: Optional[List[Optional[str]]]=None, N: Optional[int]=5, include_phones: Optional[bool]=False, budget: Optional[SearchBudget]=None, weights: Optional[MatchList.Weights]=None) -> List[Union[List[str],Tuple[List[str],List[str],str]]]:
+        """
+        Return get_mnemonics for every word in input_words, running the beam searches of all the
+        words in lockstep. The input words are found with a single walk of the input trie, each
+        round the target trie is searched once per distinct unmatched phones of all the beams,
+        and the semantic distances of the new candidate words to all translations
+        are computed in one matrix product, which makes it faster than calling get_mnemonics in a loop.
+
+        :param      input_words: the input words for which to return mnemonics
+        :param     translations: translation for each input word, or None (optional), (default None)
+        :param                N: number of mnemonics to return per word (default 5)
+        :param   include-phones: whether to output phonetic information
+        :param           budget: limits on the search time and work of the whole batch (optional), when
+                                 reached every word gets the best mnemonics finished so far and budget.exhausted is set
+        :param          weights: multipliers to score mnemonics with (optional), see get_mnemonics
+        :returns               : a list with get_mnemonics' result for each input word
+        :raises        KeyError: raises when an input word's phones are not in the dictionary
+        """
+
+        if translations is None:
+            translations = [None] * len(input_words)
+        weights = weights or MatchList.current_weights()
+        if budget:
+            budget.start()
+
+        results = [None] * len(input_words)
+        searched = []
+        for i, (input_word, translation) in enumerate(zip(input_words, translations)):
+            stored = self.__stored_mnemonics(input_word, translation, N, weights)
+            if stored is None:
+                searched.append(i)
+            elif include_phones:
+                results[i] = [ words for words, _, _ in stored ], [ phones for _, phones, _ in stored ], stored[0][2]
+            else:
+                results[i] = [ words for words, _, _ in stored ]
+
+        # one walk of the input trie finds all the input words
+        with metrics.time('search'):
+            found = self.input_trie.search_words([ input_words[i].lower() for i in searched ])
+        input_nodes = {}
+        for i in searched:
+            if input_words[i].lower() not in found:
+                raise KeyError("Can't find phones for input word:", input_words[i])
+            input_nodes[i] = found[input_words[i].lower()]
+
+        old_N = N
+        N = max(N, 5)
+
+        # words with the same translation share their semantic distances
+        semantic_distances = { translation: {} for translation in translations if translation }
+        match_lists = {}
+        for i, input_node in input_nodes.items():
+            match_lists[i] = MatchList.MatchList()
+            match_lists[i].add_match(MatchList.Match(input_node, translations[i], semantic_distances.get(translations[i]), weights))
+
+        phonetic_matches = {}
+        working_matches = { i: match_list.remove_and_retrieve_unfinished_matches(N) for i, match_list in match_lists.items() }
+        while any(working_matches.values()):
+            if budget and not budget.next_round():
+                break
+
+            # one trie search per distinct unmatched phones across all beams
+            new_nodes = []
+            for matches in working_matches.values():
+                for match in matches:
+                    if match.unmatched_phones not in phonetic_matches:
+                        with metrics.time('find_phonetic_match'):
+                            phonetic_matches[match.unmatched_phones] = self.target_trie.find_phonetic_match(match, N, weights.phonetic, weights.aoa, budget, self.ignored_words)
+                        new_nodes.extend([ node for _, node in phonetic_matches[match.unmatched_phones][:N] ])
+            if budget and budget.exhausted: # matches from an unfinished trie search aren't the best ones
+                break
+
+            # semantic distances of all new candidate words to all translations at once
+            if semantic_distances:
+                new_words = list({ node.word for node in new_nodes if any(node.word not in distances for distances in semantic_distances.values()) })
+                if new_words:
+                    distance_matrix = MatchList.semantic_distance_matrix(new_words, list(semantic_distances), weights.semantic)
+                    for row, distances in zip(distance_matrix, semantic_distances.values()):
+                        distances.update(zip(new_words, row.tolist()))
+
+            for i, matches in working_matches.items():
+                extensions = {}
+                for match, alternate in MatchList.get_paths(matches):
+                    self.__extend_match(match_lists[i], match, alternate, phonetic_matches[match.unmatched_phones], N, extensions)
+                working_matches[i] = match_lists[i].remove_and_retrieve_unfinished_matches(N)
+
+        for i, input_node in input_nodes.items():
+            matches = match_lists[i].get_finished_matches(old_N)
+            if include_phones:
+                results[i] = [ match.matched_words for match in matches ], [ "/" + match.matched_phones_raw.strip() + "/" for match in matches ], "/" + input_node.phones_raw + "/"
+            else:
+                results[i] = [ match.matched_words for match in matches ]
+        return results
+
+    def get_mnemonics_exact(self, input_word: str, translation: Optional[str] = None, N: Optional[int]=5, include_phones: Optional[bool]=False, weights: Optional[MatchList.Weights]=None) -> Union[List[str],Tuple[List[str],List[str],str]]:
+        """
+        Return the N best mnemonics for the input word by treating mnemonic construction as a
+        shortest path over positions in the input word's phones. Every dictionary word covering
+        phones[i:j] is an edge from i to j costing its phonetic delta, age of aquisition and
+        semantic distance, and a k-best Viterbi pass keeps the N cheapest paths to each position.
+        Unlike get_mnemonics the result is exact for that cost, but words always cover as many
+        phones as they have and the orthographic distance is not part of the cost.
+
+        :param       input_word: the input word for which to return mnemonics
+        :param      translation: translation for the input word (optional), (default None)
+        :param                N: number of mnemonics to return (default 5)
+        :param   include-phones: whether to output phonetic information
+        :param          weights: multipliers to score mnemonics with (optional), see get_mnemonics
+        :returns               : a list of N mnemonic phrases
+                            or : (a list of N mnemonic phrases,
+                                  a list of corresponding phonetic data,
+                                  the phonetic data of the input phrase)
+        :raises    KeyError: raises when the input word's phones are not in the dictionary
+        """
+
+        weights = weights or MatchList.current_weights()
+        with metrics.time('search'):
+            input_node = self.input_trie.search(input_word.lower())
+        if not input_node:
+            raise KeyError("Can't find phones for input word:", input_word)
+
+        word_costs = {}
+        def word_cost(node: PhoneNode) -> float:
+            if node.word not in word_costs:
+                cost = node.aoa * weights.aoa
+                if translation:
+                    cost += MatchList.semantic_distance(node.word, translation, weights.semantic)
+                word_costs[node.word] = cost
+            return word_costs[node.word]
+
+        phones = input_node.phones
+
+        # edges[i][length] -> N best (cost, node) for words covering phones[i:i+length]
+        edges = [ self.target_trie.find_segment_matches(phones[i:], N, weights.phonetic, word_cost, weights.aoa, self.ignored_words) for i in range(len(phones)) ]
+
+        # best_paths[j] -> N best (cost, previous path, node) ending after phones[:j]
+        best_paths = [ [] for _ in range(len(phones) + 1) ]
+        best_paths[0] = [ (0, None, None) ]
+        for j in range(1, len(phones) + 1):
+            candidates = []
+            for i in range(j):
+                for edge_cost, node in edges[i].get(j - i, []):
+                    for path in best_paths[i]:
+                        candidates.append((path[0] + edge_cost, path, node))
+            best_paths[j] = heapq.nsmallest(N, candidates, key=lambda x: x[0])
+
+        words = []
+        mnemonic_phones = []
+        for path in best_paths[len(phones)]:
+            nodes = []
+            while path[2]:
+                nodes.append(path[2])
+                path = path[1]
+            nodes.reverse()
+            words.append(' '.join([ node.word for node in nodes ]))
+            mnemonic_phones.append("/" + ' '.join([ node.phones_raw for node in nodes ]) + "/")
 
         if include_phones:
-            words = [ match.matched_words for match in match_list.get_finished_matches(old_N) ]
-            phones = [ "/" + match.matched_phones_raw.strip() + "/" for match in match_list.get_finished_matches(old_N) ]
-            return words, phones, "/" + input_node.phones_raw + "/"
+            return words, mnemonic_phones, "/" + input_node.phones_raw + "/"
         else:
-            return [ match.matched_words for match in match_list.get_finished_matches(old_N) ]
+            return words
 
     def mark_ignored(self, word: str) -> str:
         """
-        Mark a word ignored such that it won't be used in further mnemonics
+        Mark a word ignored such that it won't be used in further mnemonics by this transphoner,
+        the trie is shared with other transphoners so the word is only ignored here
 
         :param word: the word to be ignored
         """
-        node = self.target_trie.search(word)
-        if node:
-            node.ignored = True
+        if self.target_trie.search(word):
+            self.ignored_words.add(word)
 
     def __gen_sentence_ends(self, input_mnemonics: List[str]) -> List[str]:
         """
@@ -153,18 +552,30 @@ class WWUTransphoner:
         :returns              : a list of sentences starting with the strings found in input_mnemonics
         """
 
-        sentences = [] # finished sentences
-
-        # Encodes the input mnemonics into pytorch tensors
-        encodings = []
-        for input in input_mnemonics:
-            encodings.append(self.gpt_tokenizer.encode(input, return_tensors='pt'))
-
-        # Generate model output and decode into text
-        for encoding in encodings:
-            outputs = self.gpt_model.generate(encoding, max_length=15, do_sample=True)
-            decoded_text = self.gpt_tokenizer.decode(outputs[0], skip_special_tokens=True)
-            sentences.append(WWUTransphoner.trim_to_one_sentence(decoded_text))
+        import torch
+        from transformers import StoppingCriteriaList
+        from SentenceEndCriteria import SentenceEndCriteria
+
+        sentences = [ None ] * len(input_mnemonics) # finished sentences, in the order of input_mnemonics
+        if not input_mnemonics:
+            return sentences
+
+        # GPT doesn't use an attention mask or padding aware positions when generating, so instead of
+        # padding the prompts the mnemonics are generated in one batch per prompt length
+        batches = {}
+        for i, input_ids in enumerate(self.gpt_tokenizer(input_mnemonics)['input_ids']):
+            batches.setdefault(len(input_ids), []).append((i, input_ids))
+
+        # Generate model output for every mnemonic of a batch at once, the batch stops once every
+        # sequence has a sentence end or is 15 tokens long, and decode into text
+        for indices_and_ids in batches.values():
+            input_ids = torch.tensor([ ids for _, ids in indices_and_ids ])
+            stopping_criteria = StoppingCriteriaList([SentenceEndCriteria(self.gpt_sentence_end_ids)])
+            with torch.no_grad():
+                outputs = self.gpt_model.generate(input_ids, max_length=15, do_sample=True, stopping_criteria=stopping_criteria)
+            for (i, _), output in zip(indices_and_ids, outputs):
+                decoded_text = self.gpt_tokenizer.decode(output, skip_special_tokens=True)
+                sentences[i] = WWUTransphoner.trim_to_one_sentence(decoded_text)
 
         return sentences
 
@@ -185,57 +596,103 @@ class WWUTransphoner:
                 sentence_end = min(sentence_end, text.index(p))
         return text[:sentence_end+1]
 
-    def __gen_sentence_beginning(self, incomplete_sentence: str) -> str:
+    def __gen_sentence_beginnings(self, incomplete_sentences: List[str]) -> List[str]:
         """
-        Return a complete sentence, composed of newly generated text preceeding the
-        passed in incomplete sentence
+        Return a list of complete sentences, composed of newly generated text preceeding each
+        of the passed in incomplete sentences. Each sentence gets 3 to 7 new words, one word per
+        step, and every step runs BERT once for all sentences still being extended
 
-        :param incomplete_sentence: an incomplete sentence that still needs a beginning
-        :returns                  : a fully complete sentence
+        :param incomplete_sentences: incomplete sentences that still need a beginning
+        :returns                   : the fully complete sentences, in the same order
         """
 
-        last_token = ''
-        for _ in range(random.randrange(3,8)):
-            text = '[MASK] ' + incomplete_sentence
+        import torch
 
-            input = self.bert_tokenizer.encode_plus(text, return_tensors = "pt")
-            mask_index = torch.where(input["input_ids"][0] == self.bert_tokenizer.mask_token_id)
-            output = self.bert_model(**input)
-            logits = output.logits
-            softmax = functional.softmax(logits, dim=-1)
-            mask_word = softmax[0, mask_index, :]
-            predictions = torch.topk(mask_word, 10, dim=1)[1][0]
+        sentences = list(incomplete_sentences)
+        remaining_words = [ random.randrange(3,8) for _ in sentences ]
 
-            new_token = ""
-            for prediction in predictions:
-                temp_token = self.bert_tokenizer.decode([prediction])
-                if temp_token != '"' and temp_token != '\'':
-                    incomplete_sentence = temp_token + ' ' + incomplete_sentence
-                    break
+        with torch.inference_mode():
+            while any(remaining_words):
+                active = [ i for i in range(len(sentences)) if remaining_words[i] ]
+                texts = [ '[MASK] ' + sentences[i] for i in active ]
 
-        return incomplete_sentence
+                input = self.bert_tokenizer(texts, return_tensors = "pt", padding = True)
+                logits = self.bert_model(**input).logits
+                rows, mask_index = torch.where(input["input_ids"] == self.bert_tokenizer.mask_token_id)
+                predictions = torch.topk(logits[rows, mask_index], 10, dim=-1).indices
+
+                for row, i in enumerate(active):
+                    remaining_words[i] -= 1
+                    for prediction in predictions[row]:
+                        temp_token = self.bert_tokenizer.decode([prediction])
+                        if temp_token != '"' and temp_token != '\'':
+                            sentences[i] = temp_token + ' ' + sentences[i]
+                            break
+
+        return sentences
 
-    def gen_sentences(self, input_mnemonics: List[str]) -> List[str]:
+    def __gen_sentence_beginnings_mask_predict(self, incomplete_sentences: List[str], passes: int) -> List[str]:
         """
-        Return a list of mnemonic sentences, one sentence per mnemonic in input_mnemonics
+        Return a list of complete sentences like __gen_sentence_beginnings, but Mask-Predict style:
+        all 3 to 7 new words of a sentence start as [MASK] tokens and are filled in together.
+        After each pass the least confident new words are masked again, fewer every pass, so
+        every sentence costs the same fixed number of BERT passes whatever its number of new words
+
+        :param incomplete_sentences: incomplete sentences that still need a beginning
+        :param               passes: number of BERT passes, the first fills every mask
+        :returns                   : the fully complete sentences, in the same order
+        """
+
+        import torch
+        from torch.nn import functional
+
+        mask_id = self.bert_tokenizer.mask_token_id
+        num_words = [ random.randrange(3,8) for _ in incomplete_sentences ]
+        texts = [ '[MASK] ' * n + sentence for n, sentence in zip(num_words, incomplete_sentences) ]
+
+        input = self.bert_tokenizer(texts, return_tensors = "pt", padding = True)
+        input_ids = input["input_ids"]
+        confidence = torch.zeros(input_ids.shape)
+
+        with torch.inference_mode():
+            for p in range(passes):
+                logits = self.bert_model(**input).logits
+                rows, mask_index = torch.where(input_ids == mask_id)
+                mask_logits = logits[rows, mask_index]
+                mask_logits[:, self.bert_banned_ids] = -float('inf')
+                probabilities, predictions = functional.softmax(mask_logits, dim=-1).max(dim=-1)
+                input_ids[rows, mask_index] = predictions
+                confidence[rows, mask_index] = probabilities
+
+                # mask the least confident new words of each sentence again, the new words follow [CLS]
+                for row, n in enumerate(num_words):
+                    num_masks = n * (passes - 1 - p) // passes
+                    if num_masks:
+                        least_confident = torch.topk(confidence[row, 1:n+1], num_masks, largest=False).indices + 1
+                        input_ids[row, least_confident] = mask_id
+
+        return [ self.bert_tokenizer.decode(input_ids[row, 1:n+1]) + ' ' + sentence for row, (n, sentence) in enumerate(zip(num_words, incomplete_sentences)) ]
+
+    def gen_sentences(self, input_mnemonics: List[str], mask_predict_passes: Optional[int]=None) -> List[str]:
+        """
+        Return a list of mnemonic sentences, one sentence per mnemonic in input_mnemonics.
 
-        :param input_mnemonics: a list of mnemonics (strings)
-        :raises      TypeError: raises when output language not english, other languages not yet supported
-        :returns              : a list of sentences built around the mnemonics in input_mnemonics
+        :param     input_mnemonics: a list of mnemonics (strings)
+        :param mask_predict_passes: when set, sentence beginnings are filled in all at once and refined
+                                    over this many BERT passes, rather than one pass per word (default None)
+        :raises          TypeError: raises when output language not english, other languages not yet supported
+        :returns                  : a list of sentences built around the mnemonics in input_mnemonics
         """
         if self.output_language != 'en':
             raise TypeError("Can only generate sentences for output language: 'en'")
 
-        sentence_ends = self.__gen_sentence_ends(input_mnemonics)
-
-        complete_sentences = []
-        for incomplete_sentence in sentence_ends:
-            complete_sentences.append(self.__gen_sentence_beginning(incomplete_sentence))
-
-        return complete_sentences
+        self.load_models()
+        with metrics.time('gpt'):
+            sentence_ends = self.__gen_sentence_ends(input_mnemonics)
+        if not sentence_ends:
+            return sentence_ends
 
-a = WWUTransphoner('de', 'en')
-b = ['true push', 'troop ass']
-c = a.gen_sentences(b)
-for d in c:
-    print(d)
\ No newline at end of file
+        with metrics.time('bert'):
+            if mask_predict_passes:
+                return self.__gen_sentence_beginnings_mask_predict(sentence_ends, mask_predict_passes)
+            return self.__gen_sentence_beginnings(sentence_ends)
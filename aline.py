@@ -54,6 +54,7 @@ try:
 except ImportError:
     np = None
 
+from functools import lru_cache
 from typing import List, Union, Tuple, Dict, Optional
 
 # === Constants ===
@@ -1650,9 +1651,11 @@ def sigma_exp(p: str, q: str):
 
 
 
+@lru_cache(maxsize=None)
 def delta(p: str, q: str):
     """
     Return weighted sum of difference between P and Q.
+    Cached, there are few phones and every search and alignment compares the same pairs.
 
     (Kondrak 2002: 54)
     """
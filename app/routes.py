@@ -1,77 +1,358 @@
 from app import app
-from flask import render_template, flash, redirect
+from flask import render_template, flash, redirect, jsonify, abort, request, url_for, Response
 from app.forms import inputForm
+import profiling
+from LatencyMetrics import metrics
+from ResponseCache import ResponseCache
+from SearchBudget import SearchBudget
+from TransphonerPool import TransphonerPool
 from WWUTransphoner import WWUTransphoner
-from typing import List
+import MatchList
+from collections import namedtuple
+from concurrent.futures import Future, as_completed, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+import hmac
+import json
+import math
+import os
+import re
+import threading
+import time
+import uuid
 
-wordMatches: List[str] = None
-phoneMatches: List[str] = None
-sentenceMatches: List[str] = None
-inputWordPhones: str = None
+# results of one request, passed straight to the template
+Results = namedtuple('Results', ['wordMatches', 'phoneMatches', 'inputWordPhones', 'sentenceJob'])
 
-wwut: WWUTransphoner = None
+# one transphoner per language pair, shared by all requests and safe to use from several threads
+transphoners = TransphonerPool(app.config['MNEMONIC_STORE'], app.config['SENTENCE_BATCH_WAIT'], app.config['SENTENCE_BATCH_SIZE'], app.config['QUANTIZED_MODELS'])
+if app.config['PRELOAD_LANGUAGES']: # load up front, workers forked after importing the app share it
+    transphoners.preload(app.config['PRELOAD_LANGUAGES'])
+
+# sentences generated in the background, job id -> (time submitted, future), polled by the results page
+sentenceJobs: Dict[str,Tuple[float,Future]] = {}
+sentenceJobsLock = threading.Lock()
+
+# mnemonics of recent requests, and with CACHE_SENTENCES the first sentence generated for each mnemonic
+mnemonicCache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'], app.config['RESPONSE_CACHE_TTL'])
+sentenceCache = ResponseCache(app.config['RESPONSE_CACHE_SIZE'] * 6, app.config['RESPONSE_CACHE_TTL'])
+
+def renderTemplate(template: str, **context) -> str:
+    with metrics.time('render'):
+        return render_template(template, **context)
 
 @app.route('/', methods=['GET', 'POST'])
 @app.route('/home', methods=['GET', 'POST'])
 def home():
     form = inputForm()
-    global wordMatches
-    global phoneMatches
-    global sentenceMatches
-    global inputWordPhones
     matchesReady = False
 
-    if form.validate_on_submit():
-        matchesReady = getResults(form)
-        if matchesReady:
-            return render_template(
+    if form.validate_on_submit() and app.config['STREAM_RESULTS'] and not profileRequested():
+        # the page renders an empty table and fills it from /stream as results are found
+        streamUrl = url_for('stream', inputLang=form.inputLang.data, outputLang=form.outputLang.data, inputWord=form.inputWord.data, translation=form.translation.data, numMatches=form.numMatches.data)
+        return renderTemplate("home.html", form=form, matchesReady=True, streamUrl=streamUrl)
+    elif form.validate_on_submit():
+        results = profiledResults(form) if profileRequested() else getResults(form)
+        if results:
+            return renderTemplate(
                 "home.html",
                 form=form, 
-                matchesReady=matchesReady, 
-                wordMatches=wordMatches, 
-                phoneMatches=phoneMatches, 
-                inputWordPhones=inputWordPhones,
-                sentences=sentenceMatches)
-        else:
-            flash("Server doesn't enough data for: " + form.inputWord.data + ", sorry about that.")
-    return render_template("home.html",form=form, matchesReady=matchesReady)
-
-def getResults(form: inputForm):
-    global wordMatches
-    global phoneMatches
-    global sentenceMatches
-    global inputWordPhones
-    global wwut
+                matchesReady=True, 
+                **results._asdict())
+    return renderTemplate("home.html",form=form, matchesReady=matchesReady)
 
-    if not wwut or (form.inputLang.data != wwut.input_language and form.outputLang.data != wwut.output_language):
+def getResults(form: inputForm) -> Optional[Results]:
+    # flashes why there are no results when returning None
+    if not transphoners.is_loaded(form.inputLang.data, form.outputLang.data):
         flash("Setting up server for '" + form.inputLang.data + "' and '" + form.outputLang.data  + "', may take a moment.")
-        wwut = WWUTransphoner(form.inputLang.data, form.outputLang.data)
-    elif form.inputLang.data != wwut.input_language:
-        flash("Setting up server for '" + form.inputLang.data + "', may take a moment.")
-        wwut = WWUTransphoner(form.inputLang.data, form.outputLang.data)
-    elif form.outputLang.data != wwut.output_language:
-        flash("Setting up server for '" + form.outputLang.data + "', may take a moment.")
-        wwut = WWUTransphoner(form.inputLang.data, form.outputLang.data)
-
+    wwut = transphoners.get(form.inputLang.data, form.outputLang.data)
 
+    budget = SearchBudget(time_limit=app.config['MNEMONIC_TIME_LIMIT'])
     try:
-        wordMatches, phoneMatches, inputWordPhones = wwut.get_mnemonics(form.inputWord.data, form.translation.data, int(form.numMatches.data), include_phones=True)
+        wordMatches, phoneMatches, inputWordPhones = getMnemonics(wwut, form.inputWord.data, form.translation.data, int(form.numMatches.data), budget)
         if not wordMatches:
-            return False
+            flash(noResultsMessage(form.inputWord.data, budget))
+            return None
+        if budget.exhausted:
+            flash("Search for '" + form.inputWord.data + "' took too long, showing the best matches found in time.")
     except KeyError as error:
         flash(str(error))
+        return None
+
+    # the mnemonics are returned right away, the page fetches the sentences once they're generated
+    sentenceJob = submitSentences(wordMatches) if form.outputLang.data == 'en' else None
+
+    return Results(wordMatches, phoneMatches, inputWordPhones, sentenceJob)
+
+def profileRequested() -> bool:
+    # profiled requests aren't streamed, so the whole search runs inside getResults
+    # an X-Profile header only counts in debug mode or when it holds PROFILE_SECRET, so visitors can't profile requests
+    if not app.config['PROFILE_DIR']:
         return False
+    if app.config['PROFILE_REQUESTS']:
+        return True
+    header = request.headers.get('X-Profile')
+    secret = app.config['PROFILE_SECRET']
+    return header is not None and (app.debug or bool(secret) and hmac.compare_digest(header.encode(), secret.encode()))
+
+def profiledResults(form: inputForm) -> Optional[Results]:
+    # run getResults under the profiler, the profile is written to PROFILE_DIR named after the time, language pair and word,
+    # eg. 20261019-142501-de-en-tropisch-1a2b3c4d.prof
+    profileFormat = app.config['PROFILE_FORMAT']
+    word = re.sub(r'[^\w-]', '_', form.inputWord.data)[:64]
+    fileName = '-'.join([time.strftime('%Y%m%d-%H%M%S'), form.inputLang.data, form.outputLang.data, word, uuid.uuid4().hex[:8]])
+    os.makedirs(app.config['PROFILE_DIR'], exist_ok=True)
+    path = os.path.join(app.config['PROFILE_DIR'], fileName + ('.prof' if profileFormat == 'pstats' else '.folded'))
+    try:
+        return profiling.profile_call(lambda: getResults(form), path, profileFormat)
+    finally:
+        # the profile is written even when getResults raises, but writing it can fail too
+        if os.path.isfile(path):
+            app.logger.info("Profile of '%s' written to %s", form.inputWord.data, path)
+        else:
+            app.logger.warning("Profile of '%s' couldn't be written to %s", form.inputWord.data, path)
+
+def mnemonicKey(wwut: WWUTransphoner, inputWord: str, translation: Optional[str], N: int, weights: Optional[MatchList.Weights]=None) -> tuple:
+    """
+    Return the mnemonicCache key of a request, requests differing only in the case of
+    the input word or in whitespace share a key
+    """
+    return (wwut.input_language, wwut.output_language, inputWord.strip().lower(), (translation or '').strip() or None, N, weights or MatchList.current_weights())
+
+def getMnemonics(wwut: WWUTransphoner, inputWord: str, translation: Optional[str], N: int, budget: Optional[SearchBudget]=None) -> Tuple[List[str],List[str],str]:
+    """
+    Return wwut.get_mnemonics with phones through mnemonicCache, results cut short by the budget aren't cached
+    """
+    key = mnemonicKey(wwut, inputWord, translation, N)
+    results = mnemonicCache.get(key)
+    if results is None:
+        results = wwut.get_mnemonics(key[2], key[3], N, include_phones=True, budget=budget)
+        if not (budget and budget.exhausted):
+            mnemonicCache.put(key, results)
+    return results
+
+def generateSentences(mnemonics: List[str]) -> Future:
+    """
+    Start generating the sentences for mnemonics in the background and return a Future of them.
+    Sentences are sampled so every call gets new ones, unless CACHE_SENTENCES is set, then the
+    first sentence generated for a mnemonic is kept in sentenceCache and reused.
+    """
+    batcher = transphoners.get_sentence_batcher()
+    if not app.config['CACHE_SENTENCES']:
+        return batcher.submit(mnemonics)
+
+    cached = [ sentenceCache.get(mnemonic) for mnemonic in mnemonics ]
+    missing = [ mnemonic for mnemonic, sentence in zip(mnemonics, cached) if sentence is None ]
+    future = Future()
+    def finish(generated: Future):
+        if generated.exception():
+            future.set_exception(generated.exception())
+            return
+        new = dict(zip(missing, generated.result()))
+        for mnemonic, sentence in new.items():
+            sentenceCache.put(mnemonic, sentence)
+        future.set_result([ sentence if sentence is not None else new[mnemonic] for mnemonic, sentence in zip(mnemonics, cached) ])
+    batcher.submit(missing).add_done_callback(finish)
+    return future
+
+def submitSentences(mnemonics: List[str]) -> str:
+    """
+    Start generating the sentences for mnemonics in the background and return the job id
+    to poll /sentences/<job id> with, jobs older than SENTENCE_JOB_TTL seconds are dropped.
+    Jobs only live in the process that started them, so with several worker processes the
+    polls have to reach the same worker, see the README
+    """
+    future = generateSentences(mnemonics)
+    jobId = uuid.uuid4().hex
+    now = time.monotonic()
+    with sentenceJobsLock:
+        for oldId, (submitted, _) in list(sentenceJobs.items()):
+            if now - submitted > app.config['SENTENCE_JOB_TTL']:
+                del sentenceJobs[oldId]
+        sentenceJobs[jobId] = (now, future)
+    return jobId
+
+@app.route('/stream')
+def stream():
+    form = inputForm(formdata=request.args, meta={'csrf': False})
+    if not form.validate():
+        abort(400)
+    events = streamResults(form.inputLang.data, form.outputLang.data, form.inputWord.data, form.translation.data, int(form.numMatches.data))
+    return Response(events, mimetype='text/event-stream', headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def serverSentEvent(event: str, data: dict) -> str:
+    """
+    Return a server-sent event with the JSON encoded data
+    """
+    return "event: " + event + "\ndata: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+
+def streamResults(inputLang: str, outputLang: str, inputWord: str, translation: Optional[str], numMatches: int) -> Iterator[str]:
+    """
+    Yield server-sent events for a request: a 'mnemonic' event as soon as each mnemonic is final,
+    then a 'sentence' event as soon as each mnemonic's sentence is generated, and 'done' at the end.
+    Messages for the user are sent as 'status' events, failures as 'error' events.
+    """
+    if not transphoners.is_loaded(inputLang, outputLang):
+        yield serverSentEvent('status', {'message': "Setting up server for '" + inputLang + "' and '" + outputLang  + "', may take a moment."})
+    wwut = transphoners.get(inputLang, outputLang)
 
-    if form.outputLang.data == 'en':
-        sentenceMatches = wwut.gen_sentences(wordMatches)
+    budget = SearchBudget(time_limit=app.config['MNEMONIC_TIME_LIMIT'])
+    key = mnemonicKey(wwut, inputWord, translation, numMatches)
+    cached = mnemonicCache.get(key)
+    if cached is not None:
+        mnemonics = zip(cached[0], cached[1], [cached[2]] * len(cached[0]))
     else:
-        sentenceMatches = []
+        mnemonics = wwut.iter_mnemonics(key[2], key[3], numMatches, budget)
+
+    sentenceFutures = {} # future -> index of its mnemonic, until its sentence is sent
+    found = []
+    try:
+        for index, (words, phones, inputWordPhones) in enumerate(mnemonics):
+            found.append((words, phones, inputWordPhones))
+            yield serverSentEvent('mnemonic', {'index': index, 'words': words, 'phones': phones, 'inputWordPhones': inputWordPhones})
+            if outputLang == 'en': # start on the sentence while the search goes on
+                sentenceFutures[generateSentences([words])] = index
+            for future in [ future for future in sentenceFutures if future.done() ]:
+                yield sentenceEvent(future, sentenceFutures.pop(future))
+    except KeyError as error:
+        yield serverSentEvent('error', {'message': str(error)})
+        return
+    if cached is None and found and not budget.exhausted:
+        mnemonicCache.put(key, ([ words for words, _, _ in found ], [ phones for _, phones, _ in found ], found[0][2]))
+    if not found:
+        yield serverSentEvent('error', {'message': noResultsMessage(inputWord, budget)})
+        return
+    if budget.exhausted:
+        yield serverSentEvent('status', {'message': "Search for '" + inputWord + "' took too long, showing the best matches found in time."})
+
+    for future in as_completed(sentenceFutures):
+        yield sentenceEvent(future, sentenceFutures[future])
+    yield serverSentEvent('done', {})
+
+def noResultsMessage(inputWord: str, budget: SearchBudget) -> str:
+    # a search that ran out of time before finishing any mnemonic isn't a word without data
+    if budget.exhausted:
+        return "Search for '" + inputWord + "' timed out before any mnemonic was found, please try again."
+    return "Server doesn't have enough data for: " + inputWord + ", sorry about that."
+
+def sentenceEvent(future: Future, index: int) -> str:
+    """
+    Return the 'sentence' event for the finished sentence future of the mnemonic at index
+    """
+    if future.exception():
+        return serverSentEvent('sentence', {'index': index, 'sentence': "Couldn't generate a sentence"})
+    return serverSentEvent('sentence', {'index': index, 'sentence': future.result()[0]})
+
+@app.route('/api/mnemonics', methods=['POST'])
+def apiMnemonics():
+    """
+    Return the mnemonics for a list of words in one JSON response. The request body looks like
+        {"inputLang": "de", "outputLang": "en", "N": 5, "sentences": true,
+         "words": ["tropisch", {"word": "Haus", "translation": "house"}],
+         "weights": {"phonetic": 5.0, "orthographic": 3, "semantic": 50, "imageability": 3.0}}
+    where N, sentences, weights and every weight are optional. Each result holds the word's
+    mnemonics, their phones, the word's phones and, unless sentences is false, a sentence per
+    mnemonic, or an error when the word isn't in the dictionary. The searches share one budget of
+    API_TIME_LIMIT seconds, when it runs out the words get the best mnemonics found in time. Sentences
+    not generated within API_SENTENCE_TIME_LIMIT seconds are null. Either way the response has "partial": true.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify(error="Expected a JSON object"), 400
+
+    inputLang = body.get('inputLang')
+    outputLang = body.get('outputLang')
+    words = body.get('words')
+    N = body.get('N', 5)
+    if inputLang not in WWUTransphoner.supported_languages or outputLang not in WWUTransphoner.supported_languages:
+        return jsonify(error="inputLang and outputLang must be one of " + ", ".join(sorted(WWUTransphoner.supported_languages))), 400
+    if not isinstance(words, list) or not 0 < len(words) <= app.config['API_MAX_WORDS']:
+        return jsonify(error="words must be a list of 1 to " + str(app.config['API_MAX_WORDS']) + " words"), 400
+    if not isinstance(N, int) or isinstance(N, bool) or not 0 < N <= app.config['API_MAX_MATCHES']:
+        return jsonify(error="N must be a number from 1 to " + str(app.config['API_MAX_MATCHES'])), 400
+
+    entries = []
+    for word in words:
+        if isinstance(word, str):
+            word = {'word': word}
+        if not isinstance(word, dict) or not isinstance(word.get('word'), str) or not isinstance(word.get('translation') or '', str):
+            return jsonify(error="Every word must be a string or an object with a word and optionally a translation"), 400
+        entries.append((word['word'], word.get('translation') or None))
+
+    weights = MatchList.current_weights()
+    givenWeights = body.get('weights') or {}
+    names = {'phonetic': 'phonetic', 'orthographic': 'orthographic', 'semantic': 'semantic', 'imageability': 'aoa'}
+    if not isinstance(givenWeights, dict) or any([ name not in names or not isinstance(value, (int, float)) or isinstance(value, bool) or not math.isfinite(value) or value < 0 for name, value in givenWeights.items() ]):
+        return jsonify(error="weights must map " + ", ".join(names) + " to non-negative numbers"), 400
+    weights = weights._replace(**{ names[name]: value for name, value in givenWeights.items() })
+
+    wwut = transphoners.get(inputLang, outputLang)
+
+    # cached words are answered right away, the rest are searched together
+    keys = [ mnemonicKey(wwut, word, translation, N, weights) for word, translation in entries ]
+    mnemonics = { key: mnemonicCache.get(key) for key in keys }
+    uncached = [ key for key in dict.fromkeys(keys) if mnemonics[key] is None ]
+
+    # words that aren't in the dictionary get an error instead of failing the whole batch
+    found = wwut.input_trie.search_words([ key[2] for key in uncached ])
+    searched = [ key for key in uncached if key[2] in found ]
+    budget = SearchBudget(time_limit=app.config['API_TIME_LIMIT'])
+    for key, result in zip(searched, wwut.get_mnemonics_batch([ key[2] for key in searched ], [ key[3] for key in searched ], N, include_phones=True, budget=budget, weights=weights)):
+        mnemonics[key] = result
+        if not budget.exhausted:
+            mnemonicCache.put(key, result)
+
+    results = []
+    for (word, translation), key in zip(entries, keys):
+        if mnemonics[key] is not None:
+            wordMatches, phoneMatches, inputWordPhones = mnemonics[key]
+            results.append({'word': word, 'translation': translation, 'mnemonics': wordMatches, 'phones': phoneMatches, 'inputPhones': inputWordPhones})
+        else:
+            results.append({'word': word, 'translation': translation, 'error': "Can't find phones for input word"})
+
+    partial = budget.exhausted
+    if body.get('sentences', True) and outputLang == 'en':
+        # submitted in batch sized chunks so other requests' sentences aren't stuck behind the whole list
+        allMatches = [ mnemonic for result in results for mnemonic in result.get('mnemonics', []) ]
+        chunkSize = app.config['SENTENCE_BATCH_SIZE']
+        chunks = [ (allMatches[i:i + chunkSize], generateSentences(allMatches[i:i + chunkSize])) for i in range(0, len(allMatches), chunkSize) ]
+        done, _ = wait([ future for _, future in chunks ], timeout=app.config['API_SENTENCE_TIME_LIMIT'])
+        sentences = []
+        for chunk, future in chunks:
+            sentences.extend(future.result() if future in done else [None] * len(chunk))
+        partial = partial or len(done) < len(chunks)
+        start = 0
+        for result in results:
+            if 'mnemonics' in result:
+                result['sentences'] = sentences[start:start + len(result['mnemonics'])]
+                start += len(result['mnemonics'])
+
+    return jsonify(inputLang=inputLang, outputLang=outputLang, partial=partial, results=results)
+
+@app.route('/sentences/<jobId>')
+def sentences(jobId: str):
+    with sentenceJobsLock:
+        job = sentenceJobs.get(jobId)
+    if not job: # expired, or started by another worker process
+        return jsonify(done=True, error="These sentences are no longer available, search again to generate new ones"), 404
+    future = job[1]
+    if not future.done():
+        return jsonify(done=False)
+    if future.exception():
+        return jsonify(done=True, error=str(future.exception()))
+    return jsonify(done=True, sentences=future.result())
+
 
-    return True
+@app.route('/cache')
+def cacheStats():
+    return jsonify(mnemonics=mnemonicCache.stats(), sentences=sentenceCache.stats())
 
+@app.route('/metrics')
+def latencyMetrics():
+    # per stage latency histograms in the Prometheus text format, for a scraper
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/about')
 def about():
-    return render_template("about.html")
+    return renderTemplate("about.html")
 
 
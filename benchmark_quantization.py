@@ -0,0 +1,85 @@
+"""
+Compare the full precision and the int8 quantized sentence generation models on CPU:
+latency of gen_sentences, size of the GPT and BERT weights, and how often both agree.
+
+usage: python benchmark_quantization.py [--runs RUNS] [--seed SEED] [mnemonic ...]
+"""
+import argparse
+import io
+import random
+import time
+import torch
+from WWUTransphoner import WWUTransphoner
+from typing import List, Tuple
+
+default_mnemonics = ['trip ash', 'troop ash', 'true push', 'trap ash', 'true piece', 'tree kill']
+
+def model_size(model: torch.nn.Module) -> float:
+    """
+    Return the size of the model's weights in MB
+    """
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 2**20
+
+def time_sentences(wwut: WWUTransphoner, mnemonics: List[str], runs: int, seed: int) -> Tuple[float,List[List[str]]]:
+    """
+    Return the mean seconds per gen_sentences call, and the sentences of every run.
+    Each run is seeded so both models sample with the same random numbers.
+    """
+    wwut.gen_sentences(mnemonics) # warm up
+    all_sentences = []
+    start = time.perf_counter()
+    for run in range(runs):
+        random.seed(seed + run)
+        torch.manual_seed(seed + run)
+        all_sentences.append(wwut.gen_sentences(mnemonics))
+    return (time.perf_counter() - start) / runs, all_sentences
+
+def top_token_agreement(fp32: WWUTransphoner, int8: WWUTransphoner, mnemonics: List[str]) -> Tuple[float,float]:
+    """
+    Return the fraction of mnemonics for which both models predict the same most likely next GPT
+    token, and the same most likely BERT token for a [MASK] in front of the mnemonic
+    """
+    gpt_agree = 0
+    bert_agree = 0
+    with torch.inference_mode():
+        for mnemonic in mnemonics:
+            gpt_input = fp32.gpt_tokenizer(mnemonic, return_tensors='pt')
+            gpt_agree += int(fp32.gpt_model(**gpt_input).logits[0, -1].argmax() == int8.gpt_model(**gpt_input).logits[0, -1].argmax())
+            bert_input = fp32.bert_tokenizer('[MASK] ' + mnemonic, return_tensors='pt')
+            bert_agree += int(fp32.bert_model(**bert_input).logits[0, 1].argmax() == int8.bert_model(**bert_input).logits[0, 1].argmax())
+    return gpt_agree / len(mnemonics), bert_agree / len(mnemonics)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark int8 quantized sentence generation against full precision')
+    parser.add_argument('mnemonics', nargs='*', default=default_mnemonics, help='mnemonics to build sentences for')
+    parser.add_argument('--runs', type=int, default=5, help='gen_sentences calls timed per model')
+    parser.add_argument('--seed', type=int, default=0, help='first random seed')
+    args = parser.parse_args()
+
+    fp32 = WWUTransphoner('en', 'en')
+    int8 = WWUTransphoner('en', 'en', quantized=True)
+
+    fp32_time, fp32_sentences = time_sentences(fp32, args.mnemonics, args.runs, args.seed)
+    int8_time, int8_sentences = time_sentences(int8, args.mnemonics, args.runs, args.seed)
+    pairs = [ (a, b) for fp32_run, int8_run in zip(fp32_sentences, int8_sentences) for a, b in zip(fp32_run, int8_run) ]
+    same_sentences = sum([ a == b for a, b in pairs ]) / len(pairs)
+    gpt_agree, bert_agree = top_token_agreement(fp32, int8, args.mnemonics)
+
+    print('{:<24}{:>12}{:>12}'.format('', 'fp32', 'int8'))
+    print('{:<24}{:>12.3f}{:>12.3f}'.format('seconds per call', fp32_time, int8_time))
+    print('{:<24}{:>12.1f}{:>12.1f}'.format('GPT weights (MB)', model_size(fp32.gpt_model), model_size(int8.gpt_model)))
+    print('{:<24}{:>12.1f}{:>12.1f}'.format('BERT weights (MB)', model_size(fp32.bert_model), model_size(int8.bert_model)))
+    print()
+    print('speedup: {:.2f}x'.format(fp32_time / int8_time))
+    print('identical sentences with the same seed: {:.0%}'.format(same_sentences))
+    print('same top GPT next token: {:.0%}'.format(gpt_agree))
+    print('same top BERT mask token: {:.0%}'.format(bert_agree))
+    for a, b in pairs[:len(args.mnemonics)]:
+        print()
+        print(' fp32:', a)
+        print(' int8:', b)
+
+if __name__ == '__main__':
+    main()
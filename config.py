@@ -1,4 +1,47 @@
 import os
 
 class Config(object):
-    SECRET_KEY = os.environ.get('SECRET_KEY') or 'secret-key'
\ No newline at end of file
+    SECRET_KEY = os.environ.get('SECRET_KEY') or 'secret-key'
+
+    # seconds a mnemonic search may take before returning the best matches found so far
+    MNEMONIC_TIME_LIMIT = float(os.environ.get('MNEMONIC_TIME_LIMIT') or 5.0)
+
+    # seconds a sentence generation call waits for concurrent calls to share its batch
+    SENTENCE_BATCH_WAIT = float(os.environ.get('SENTENCE_BATCH_WAIT') or 0.005)
+    # number of mnemonics at which a sentence batch runs without waiting longer
+    SENTENCE_BATCH_SIZE = int(os.environ.get('SENTENCE_BATCH_SIZE') or 32)
+    # generate sentences with int8 quantized GPT and BERT, faster and smaller on CPU, see benchmark_quantization.py
+    QUANTIZED_MODELS = (os.environ.get('QUANTIZED_MODELS') or 'false').lower() == 'true'
+    # stream results to the page as they're found, otherwise the page waits for the mnemonics and polls for the sentences
+    STREAM_RESULTS = (os.environ.get('STREAM_RESULTS') or 'true').lower() != 'false'
+    # seconds the sentences of a request are kept for the results page to fetch
+    SENTENCE_JOB_TTL = float(os.environ.get('SENTENCE_JOB_TTL') or 300)
+
+    # SQLite file of mnemonics precomputed by precompute_mnemonics.py, looked up before searching
+    MNEMONIC_STORE = os.environ.get('MNEMONIC_STORE') or None
+
+    # most words and mnemonics per word a /api/mnemonics request can ask for
+    API_MAX_WORDS = int(os.environ.get('API_MAX_WORDS') or 1000)
+    API_MAX_MATCHES = int(os.environ.get('API_MAX_MATCHES') or 20)
+    # seconds the searches of a /api/mnemonics request may take together before returning the best matches found so far
+    API_TIME_LIMIT = float(os.environ.get('API_TIME_LIMIT') or 30.0)
+    # seconds a /api/mnemonics request waits for its sentences, the ones not generated by then are left out
+    API_SENTENCE_TIME_LIMIT = float(os.environ.get('API_SENTENCE_TIME_LIMIT') or 60.0)
+
+    # recent mnemonics are cached in memory, at most RESPONSE_CACHE_SIZE requests for RESPONSE_CACHE_TTL seconds
+    RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE') or 1024)
+    RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL') or 3600)
+    # keep the first sentence generated for a mnemonic and reuse it, instead of sampling a new one every time
+    CACHE_SENTENCES = (os.environ.get('CACHE_SENTENCES') or 'false').lower() == 'true'
+
+    # language pairs loaded when the app starts, eg. 'de:en,en:en', instead of on their first request
+    PRELOAD_LANGUAGES = [ tuple(pair.split(':')) for pair in (os.environ.get('PRELOAD_LANGUAGES') or '').split(',') if pair ]
+
+    # directory cProfile stats of profiled requests are written to, requests are only profiled when it's set
+    PROFILE_DIR = os.environ.get('PROFILE_DIR') or None
+    # profile every request, otherwise only requests sent with an X-Profile header are
+    PROFILE_REQUESTS = (os.environ.get('PROFILE_REQUESTS') or 'false').lower() == 'true'
+    # value the X-Profile header must hold for the request to be profiled, any value is enough in debug mode
+    PROFILE_SECRET = os.environ.get('PROFILE_SECRET') or None
+    # 'pstats' for cProfile stats or 'collapsed' for sampled stacks to draw flamegraphs from
+    PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT') or 'pstats'
@@ -0,0 +1,94 @@
+"""
+Generate mnemonics for a vocabulary list on all cores. Each line of the word file holds a word
+and optionally its translation, separated by a tab. Results are written as JSON lines in the order
+of the word file, a run writing to an existing output file resumes after the words it already has.
+
+usage: python generate_mnemonics.py input_language output_language word_file output_file [--N N] [--processes PROCESSES] [--store STORE]
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+import sys
+import time
+from WWUTransphoner import WWUTransphoner
+from typing import List, Optional, Tuple
+
+transphoner = None # each worker process builds its transphoner, and with it the tries, once
+
+def init_worker(input_language: str, output_language: str, store: Optional[str]):
+    """
+    Build the worker process' transphoner
+    """
+    global transphoner
+    transphoner = WWUTransphoner(input_language, output_language, store=store)
+
+def find_mnemonics(entry: Tuple[str,Optional[str]], N: int) -> dict:
+    """
+    Return the JSON line for a (word, translation) entry of the word file
+    """
+    word, translation = entry
+    result = {'word': word, 'translation': translation}
+    try:
+        result['mnemonics'], result['phones'], result['input_phones'] = transphoner.get_mnemonics(word, translation, N, include_phones=True)
+    except KeyError:
+        result['error'] = "Can't find phones for input word"
+    return result
+
+def read_words(path: str) -> List[Tuple[str,Optional[str]]]:
+    """
+    Return the (word, translation) entries of the word file, translation is None when missing
+    """
+    entries = []
+    with open(path, encoding='utf-8') as word_file:
+        for line in word_file:
+            fields = line.strip().split('\t')
+            if fields[0]:
+                entries.append((fields[0].strip(), fields[1].strip() if len(fields) > 1 and fields[1].strip() else None))
+    return entries
+
+def count_finished(path: str) -> int:
+    """
+    Return the number of complete lines in the output file, dropping a line left half written
+    by an interrupted run
+    """
+    if not os.path.isfile(path):
+        return 0
+    with open(path, 'rb+') as output_file:
+        data = output_file.read()
+        finished = data.rfind(b'\n') + 1
+        output_file.truncate(finished)
+    return data.count(b'\n', 0, finished)
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate mnemonics for a list of words on all cores')
+    parser.add_argument('input_language', help='language of the input words')
+    parser.add_argument('output_language', help='language of the mnemonics')
+    parser.add_argument('word_file', help='one word per line, optionally followed by a tab and its translation')
+    parser.add_argument('output_file', help='JSON lines file the results are written to, resumed if it exists')
+    parser.add_argument('--N', type=int, default=5, help='mnemonics per word')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--store', default=None, help='MnemonicStore with precomputed mnemonics to look up first')
+    args = parser.parse_args()
+
+    entries = read_words(args.word_file)
+    finished = count_finished(args.output_file)
+    entries = entries[finished:]
+    print('{} words done, {} to go'.format(finished, len(entries)), file=sys.stderr)
+
+    start = time.perf_counter()
+    last_report = start
+    with open(args.output_file, 'a', encoding='utf-8') as output_file, \
+         multiprocessing.Pool(args.processes, init_worker, (args.input_language, args.output_language, args.store)) as pool:
+        # imap returns results in input order, every line is flushed so it's kept if the run is interrupted
+        for i, result in enumerate(pool.imap(functools.partial(find_mnemonics, N=args.N), entries, chunksize=4), 1):
+            output_file.write(json.dumps(result, ensure_ascii=False) + '\n')
+            output_file.flush()
+            now = time.perf_counter()
+            if now - last_report >= 10 or i == len(entries):
+                print('{}/{} words, {:.1f} words/s'.format(i, len(entries), i / (now - start)), file=sys.stderr, flush=True)
+                last_report = now
+
+if __name__ == '__main__':
+    main()
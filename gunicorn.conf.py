@@ -0,0 +1,23 @@
+# gunicorn settings for serving the app with preforked workers:
+#     PRELOAD_LANGUAGES=de:en,en:en gunicorn MnemonicsRecommendationApp:app
+# the app, and with PRELOAD_LANGUAGES its tries, embeddings and models, are loaded once in the
+# master before the workers are forked, so the workers share them copy-on-write
+import multiprocessing
+import os
+
+# torch reads these when it's imported by the preloaded app, with one thread it never starts the
+# OpenMP thread pool, which doesn't survive a fork and can hang the workers once they use torch.
+# The workers share the cores anyway, one torch thread each keeps them from oversubscribing.
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count())
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS') or 4)
+timeout = 120
+
+def when_ready(server):
+    # sentence jobs live in the worker that started them, a poll reaching another worker gets a 404
+    if workers > 1 and (os.environ.get('STREAM_RESULTS') or 'true').lower() == 'false':
+        server.log.warning("STREAM_RESULTS=false with %d workers, pages poll for their sentences and need sticky sessions", workers)
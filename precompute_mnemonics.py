@@ -0,0 +1,61 @@
+"""
+Precompute the mnemonics of every word in an input language's dictionary and write them to a
+MnemonicStore, which WWUTransphoner(..., store=path) reads before searching. Words are searched
+on all cores, results are committed as they arrive so an interrupted run resumes where it stopped.
+
+usage: python precompute_mnemonics.py input_language output_language [--store STORE] [--N N] [--processes PROCESSES]
+"""
+import argparse
+import functools
+import multiprocessing
+import os
+import time
+from MnemonicStore import MnemonicStore
+from PhoneTrie import shared_trie
+from WWUTransphoner import WWUTransphoner
+from typing import List, Tuple
+
+transphoner = None # each worker process builds its transphoner once
+
+def init_worker(input_language: str, output_language: str):
+    """
+    Build the worker process' transphoner
+    """
+    global transphoner
+    transphoner = WWUTransphoner(input_language, output_language)
+
+def find_mnemonics(word: str, N: int) -> Tuple[str,List[Tuple[str,str,str]]]:
+    """
+    Return word and its N best mnemonics, as stored by MnemonicStore
+    """
+    words, phones, input_phones = transphoner.get_mnemonics(word, N=N, include_phones=True)
+    return word, [ (w, p, input_phones) for w, p in zip(words, phones) ]
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute mnemonics for every dictionary word of a language')
+    parser.add_argument('input_language', help='language of the input words')
+    parser.add_argument('output_language', help='language of the mnemonics')
+    parser.add_argument('--store', default='mnemonics.db', help='SQLite file the mnemonics are written to')
+    parser.add_argument('--N', type=int, default=5, help='mnemonics stored per word, rows of more than 5 only serve requests for exactly that many')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes')
+    parser.add_argument('--commit-every', type=int, default=100, help='words written per transaction')
+    args = parser.parse_args()
+
+    store = MnemonicStore(args.store)
+    done = store.stored_words(args.input_language, args.output_language, args.N)
+    words = [ word for word in shared_trie(args.input_language).words() if word not in done ]
+    print('{} words stored, {} to go'.format(len(done), len(words)))
+
+    start = time.perf_counter()
+    results = []
+    with multiprocessing.Pool(args.processes, init_worker, (args.input_language, args.output_language)) as pool:
+        for i, result in enumerate(pool.imap_unordered(functools.partial(find_mnemonics, N=args.N), words, chunksize=8), 1):
+            results.append(result)
+            if len(results) >= args.commit_every or i == len(words):
+                store.put_many(args.input_language, args.output_language, args.N, results)
+                results = []
+                elapsed = time.perf_counter() - start
+                print('{}/{} words, {:.1f} words/s'.format(i, len(words), i / elapsed), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import cProfile
+import collections
+import sys
+import threading
+from typing import Any, Callable, Counter
+
+def profile_call(fn: Callable[[],Any], path: str, format: str='pstats', interval: float=0.001) -> Any:
+    """
+    Return fn(), profiling the call and writing the profile to path, even if fn raises.
+
+    :param       fn: the call to profile
+    :param     path: file the profile is written to
+    :param   format: 'pstats' for cProfile stats, for python -m pstats or snakeviz, or 'collapsed' for
+                     sampled stacks in the collapsed format of flamegraph.pl and speedscope (default 'pstats')
+    :param interval: seconds between samples with the collapsed format (default 0.001)
+    :raises ValueError: raises when format is neither 'pstats' nor 'collapsed'
+    """
+    if format == 'pstats':
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(fn)
+        finally:
+            profiler.dump_stats(path)
+    elif format == 'collapsed':
+        stacks = collections.Counter()
+        done = threading.Event()
+        sampler = threading.Thread(target=sample_stacks, args=(threading.get_ident(), stacks, done, interval), daemon=True)
+        sampler.start()
+        try:
+            return fn()
+        finally:
+            done.set()
+            sampler.join()
+            with open(path, 'w') as f:
+                for stack, count in stacks.items():
+                    f.write(stack + ' ' + str(count) + '\n')
+    else:
+        raise ValueError("Unknown profile format:", format)
+
+def sample_stacks(thread_id: int, stacks: Counter[str], done: threading.Event, interval: float):
+    """
+    Count the stacks of a thread every interval seconds until done is set, a stack is its
+    frames from the outermost as 'file:function' separated by ';'
+
+    :param thread_id: ident of the thread sampled
+    :param    stacks: stack -> number of samples, counted in place
+    :param      done: set once sampling should stop
+    :param  interval: seconds between samples
+    """
+    while not done.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        frames = []
+        while frame:
+            frames.append(frame.f_code.co_filename.rsplit('/', 1)[-1] + ':' + frame.f_code.co_name)
+            frame = frame.f_back
+        if frames:
+            stacks[';'.join(reversed(frames))] += 1
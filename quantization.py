@@ -0,0 +1,61 @@
+import inspect
+import os
+import torch
+from torch import nn
+try:
+    from transformers.pytorch_utils import Conv1D
+except ImportError: # transformers before 4.20 keeps it with the model utilities
+    from transformers.modeling_utils import Conv1D
+
+# torch.load only has weights_only since torch 1.13, older versions pass unknown keywords on to pickle
+load_kwargs = { 'weights_only': False } if 'weights_only' in inspect.signature(torch.load).parameters else {}
+
+def conv1d_to_linear(model: nn.Module) -> nn.Module:
+    """
+    Replace the Conv1D layers transformers uses in GPT with the equivalent nn.Linear layers,
+    Conv1D computes x @ weight + bias so the Linear weight is the transposed Conv1D weight.
+
+    :param model: model whose layers are replaced, in place
+    :returns    : the model
+    """
+    for name, module in model.named_children():
+        if isinstance(module, Conv1D):
+            linear = nn.Linear(module.weight.shape[0], module.nf)
+            linear.weight = nn.Parameter(module.weight.detach().t().contiguous())
+            linear.bias = nn.Parameter(module.bias.detach())
+            setattr(model, name, linear)
+        else:
+            conv1d_to_linear(module)
+    return model
+
+def quantize(model: nn.Module) -> nn.Module:
+    """
+    Return the model with all of its linear layers dynamically quantized to int8, for CPU inference
+
+    :param model: full precision model
+    :returns    : the quantized model
+    """
+    model.eval()
+    return torch.quantization.quantize_dynamic(conv1d_to_linear(model), {nn.Linear}, dtype=torch.qint8)
+
+def load_quantized(model_class: type, model_path: str, quantized_path: str, **kwargs) -> nn.Module:
+    """
+    Return the quantized version of the pretrained model saved at model_path. The quantized weights
+    are cached at quantized_path the first time, later loads only read the model's config and the
+    cached int8 weights.
+
+    :param    model_class: transformers model class, eg. BertForMaskedLM
+    :param     model_path: directory of the full precision model, as written by save_pretrained
+    :param quantized_path: file the quantized weights are cached in
+    :param         kwargs: passed on to the model's config, eg. return_dict = True
+    :returns             : the quantized model, in eval mode
+    """
+    if os.path.isfile(quantized_path):
+        config = model_class.config_class.from_pretrained(model_path, **kwargs)
+        model = quantize(model_class(config))
+        model.load_state_dict(torch.load(quantized_path, **load_kwargs))
+    else:
+        model = quantize(model_class.from_pretrained(model_path, **kwargs))
+        torch.save(model.state_dict(), quantized_path)
+    model.eval()
+    return model
@@ -0,0 +1,42 @@
+import unittest
+import aline
+import MatchList
+from PhoneTrie import PhoneNode, PhoneTrie
+from WWUTransphoner import WWUTransphoner
+
+class TestExactMnemonicsMethods(unittest.TestCase):
+
+    def test_matches_brute_force(self):
+        wwut = WWUTransphoner('en', 'en')
+
+        # a small target trie built from the english phones of a few words
+        words = ["pay", "pie", "pa", "per", "paper", "up", "upper", "ape", "air", "pipe", "pepper", "hay", "eight"]
+        trie = PhoneTrie.__new__(PhoneTrie)
+        trie.root = PhoneNode("")
+        trie.num_nodes = 0
+        nodes = [ wwut.input_trie.search(word) for word in words ]
+        for node in nodes:
+            trie.insert(node.word, node.phones, node.phones_raw, node.aoa)
+        wwut.target_trie = trie
+
+        weights = MatchList.Weights(phonetic=4.0, orthographic=0, semantic=0, aoa=0.5)
+        phones = wwut.input_trie.search("paper").phones
+
+        # every way of covering the phones with words as long as the phones they cover
+        def word_cost(start, node):
+            return sum([ aline.delta(phones[start + k], phone) for k, phone in enumerate(node.phones) ]) * weights.phonetic + node.aoa * weights.aoa
+        costs = []
+        def cover(start, cost, words):
+            if start == len(phones):
+                costs.append((cost, ' '.join(words)))
+            for node in nodes:
+                if start + len(node.phones) <= len(phones):
+                    cover(start + len(node.phones), cost + word_cost(start, node), words + [node.word])
+        cover(0, 0, [])
+        costs.sort()
+
+        mnemonics = wwut.get_mnemonics_exact("paper", N=5, weights=weights)
+        self.assertEqual(mnemonics[0], costs[0][1])
+        cost_of = dict([ (words, cost) for cost, words in costs ])
+        for mnemonic, (cost, _) in zip(mnemonics, costs[:5]):
+            self.assertAlmostEqual(cost_of[mnemonic], cost)
@@ -0,0 +1,26 @@
+import unittest
+from LatencyMetrics import LatencyMetrics
+
+class TestLatencyMetricsMethods(unittest.TestCase):
+
+    def test_quantiles_and_render(self):
+        metrics = LatencyMetrics(buckets=(0.1, 1.0))
+        for seconds in [0.05] * 90 + [0.5] * 9 + [2.0]:
+            metrics.observe("search", seconds)
+        self.assertEqual(metrics.count("search"), 100)
+        self.assertAlmostEqual(metrics.quantile("search", 0.5), 0.1 * 50 / 90)
+        self.assertAlmostEqual(metrics.quantile("search", 0.95), 0.1 + 0.9 * 5 / 9)
+        self.assertEqual(metrics.quantile("search", 0.999), 1.0)
+        self.assertIsNone(metrics.quantile("bert", 0.5))
+
+        text = metrics.render()
+        self.assertIn('mnemonics_stage_duration_seconds_bucket{stage="search",le="0.1"} 90', text)
+        self.assertIn('mnemonics_stage_duration_seconds_bucket{stage="search",le="1.0"} 99', text)
+        self.assertIn('mnemonics_stage_duration_seconds_bucket{stage="search",le="+Inf"} 100', text)
+        self.assertIn('mnemonics_stage_duration_seconds_count{stage="search"} 100', text)
+
+    def test_time(self):
+        metrics = LatencyMetrics()
+        with metrics.time("render"):
+            pass
+        self.assertEqual(metrics.count("render"), 1)
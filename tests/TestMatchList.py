@@ -1,5 +1,6 @@
 import unittest
 import MatchList
+from PhoneTrie import PhoneNode
 
 class TestMatchMethods(unittest.TestCase):
 
@@ -21,3 +22,50 @@ class TestMatchMethods(unittest.TestCase):
         self.assertTrue(retrieved_matches[0].unmatched_phones == 'sfʊl')
         self.assertTrue(len(finished_matches) == 1)
         self.assertTrue(finished_matches[0].matched_phones, "ɡɹeɪsfʊl")
+
+    def test_matchlist_extend_and_retrieve(self):
+        input_node = PhoneNode('')
+        input_node.word, input_node.phones = "graceful", "ɡɹeɪsfʊl"
+        gray, grey = PhoneNode('ɪ'), PhoneNode('ɪ')
+        gray.word, gray.phones, gray.aoa = "gray", "ɡɹeɪ", 2
+        grey.word, grey.phones, grey.aoa = "grey", "ɡɹeɪ", 4
+        starting_match = MatchList.Match(input_node)
+        match_list = MatchList.MatchList()
+        match_list.add_match(starting_match.extend(grey, 0))
+        match_list.add_match(starting_match.extend(gray, 0))
+        self.assertEqual(starting_match.matched_words, "") # extend copies the match
+        retrieved_matches = match_list.remove_and_retrieve_unfinished_matches()
+        self.assertEqual(match_list.unfinished_matches, {})
+
+        # homophones are merged, the better path holds the other one
+        self.assertEqual([ match.matched_words for match in retrieved_matches ], [" gray"])
+        self.assertEqual([ alternate.matched_words for alternate in retrieved_matches[0].alternates ], [" grey"])
+        paths = MatchList.get_paths(retrieved_matches)
+        self.assertEqual([ (match.matched_words, alternate) for match, alternate in paths[:1] ], [(" gray", None)])
+        self.assertEqual(len(match_list.remove_and_retrieve_unfinished_matches()), 0)
+
+    def test_alternates_split_when_finished(self):
+        input_node = PhoneNode('')
+        input_node.word, input_node.phones = "graceful", "ɡɹeɪsfʊl"
+        nodes = []
+        for word, phones, aoa in [("grey", "ɡɹeɪ", 4), ("gray", "ɡɹeɪ", 2), ("full", "sfʊl", 3)]:
+            nodes.append(PhoneNode(phones[-1]))
+            nodes[-1].word, nodes[-1].phones, nodes[-1].aoa = word, phones, aoa
+        grey, gray, full = nodes
+        starting_match = MatchList.Match(input_node)
+
+        # the alternate extended like its match gets the delta it would get extended on its own
+        match_list = MatchList.MatchList()
+        match_list.add_match(starting_match.extend(grey, 0.5))
+        match_list.add_match(starting_match.extend(gray, 1.0))
+        match, = match_list.remove_and_retrieve_unfinished_matches()
+        extended = match.extend(full, 0.25)
+        match_list.add_match(extended)
+        match_list.add_alternate(extended, match.extend_alternate(match.alternates[0], full, 0.25, extended))
+
+        unmerged = MatchList.MatchList()
+        unmerged.add_match(starting_match.extend(grey, 0.5).extend(full, 0.25))
+        unmerged.add_match(starting_match.extend(gray, 1.0).extend(full, 0.25))
+        finished = [ (match.matched_words, match.matched_phones_raw, match.delta) for match in match_list.get_finished_matches() ]
+        self.assertEqual(finished, [ (match.matched_words, match.matched_phones_raw, match.delta) for match in unmerged.get_finished_matches() ])
+        self.assertEqual([ match.matched_words for match in match_list.get_finished_matches() ], ["gray full", "grey full"])
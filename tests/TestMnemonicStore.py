@@ -0,0 +1,42 @@
+import os
+import tempfile
+import unittest
+import MatchList
+from MnemonicStore import MnemonicStore
+
+class TestMnemonicStoreMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = MnemonicStore(os.path.join(self.directory.name, "mnemonics.db"))
+        self.mnemonics = [ ("trip ash", "/tɹɪp æʃ/", "/tʁoːpɪʃ/"), ("troop ash", "/tɹup æʃ/", "/tʁoːpɪʃ/") ]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_get_stored_mnemonics(self):
+        self.store.put_many("de", "en", 2, [("tropisch", self.mnemonics)])
+        self.assertEqual(self.store.get("de", "en", "tropisch", 2), self.mnemonics)
+        self.assertEqual(self.store.get("de", "en", "tropisch", 1), self.mnemonics[:1])
+        self.assertIsNone(self.store.get("de", "en", "tropisch", 5)) # fewer mnemonics stored than wanted
+        self.assertIsNone(self.store.get("de", "fr", "tropisch", 2))
+        self.assertEqual(self.store.stored_words("de", "en", 2), {"tropisch"})
+
+    def test_other_beam_width_misses(self):
+        mnemonics = [ ("trip ash " + str(i), "/tɹɪp æʃ/", "/tʁoːpɪʃ/") for i in range(10) ]
+        self.store.put_many("de", "en", 10, [("tropisch", mnemonics)])
+        self.assertEqual(self.store.get("de", "en", "tropisch", 10), mnemonics)
+        self.assertIsNone(self.store.get("de", "en", "tropisch", 5)) # searched with a beam of 10, not 5
+        self.assertEqual(self.store.stored_words("de", "en", 5), set())
+        self.store.put_many("de", "en", 5, [("tropisch", mnemonics[:5])])
+        self.assertEqual(self.store.get("de", "en", "tropisch", 3), mnemonics[:3]) # both searched with a beam of 5
+        self.assertEqual(self.store.stored_words("de", "en", 3), {"tropisch"})
+
+    def test_multipliers_change_misses(self):
+        self.store.put_many("de", "en", 2, [("tropisch", self.mnemonics)])
+        phonetic_multiplier = MatchList.phonetic_multiplier
+        MatchList.phonetic_multiplier = phonetic_multiplier + 1
+        try:
+            self.assertIsNone(self.store.get("de", "en", "tropisch", 2))
+        finally:
+            MatchList.phonetic_multiplier = phonetic_multiplier
@@ -0,0 +1,39 @@
+import random
+import unittest
+import aline
+import MatchList
+from WWUTransphoner import WWUTransphoner
+
+class TestPhoneTrieMethods(unittest.TestCase):
+
+    def test_find_phonetic_match_matches_brute_force(self):
+        wwut = WWUTransphoner('en', 'en')
+        trie = wwut.target_trie
+
+        def brute_force(phones, phonetic_multiplier, aoa_multiplier):
+            # score every word no longer than the phones, without abandoning any subtree
+            scores = []
+            nodes = [ (child, 0, 0.0) for child in trie.root.children.values() ]
+            while nodes:
+                node, depth, phonetic_delta = nodes.pop()
+                phonetic_delta -= aline.delta(phones[depth], node.char)
+                temp = node if node.is_word else None
+                while temp:
+                    if not temp.ignored:
+                        scores.append(phonetic_delta * phonetic_multiplier - temp.aoa * aoa_multiplier)
+                    temp = temp.next
+                if depth + 1 < len(phones):
+                    nodes.extend([ (child, depth + 1, phonetic_delta) for child in node.children.values() ])
+            return sorted(scores, reverse=True)
+
+        random.seed(1)
+        words = random.sample(sorted(wwut.input_trie.words()), 15)
+        for word in words:
+            match = MatchList.Match(wwut.input_trie.search(word))
+            for phonetic_multiplier, aoa_multiplier in [(1.0, 0.0), (5.0, 3.0), (0.5, 10.0)]:
+                matches = trie.find_phonetic_match(match, 5, phonetic_multiplier, aoa_multiplier)
+                scores = [ delta * phonetic_multiplier - node.aoa * aoa_multiplier for delta, node in matches ]
+                expected = brute_force(match.unmatched_phones, phonetic_multiplier, aoa_multiplier)[:5]
+                self.assertEqual(len(scores), len(expected))
+                for score, best in zip(scores, expected):
+                    self.assertAlmostEqual(score, best, msg=word)
@@ -0,0 +1,23 @@
+import os
+import pstats
+import tempfile
+import time
+import unittest
+import profiling
+
+class TestProfilingMethods(unittest.TestCase):
+
+    def test_profile_formats(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tropisch.prof")
+            self.assertEqual(profiling.profile_call(lambda: sum(range(1000)), path), 499500)
+            self.assertGreater(pstats.Stats(path).total_calls, 0)
+
+            path = os.path.join(directory, "tropisch.folded")
+            profiling.profile_call(lambda: time.sleep(0.05), path, 'collapsed')
+            with open(path) as f:
+                lines = f.read().splitlines()
+            self.assertTrue(lines)
+            self.assertTrue(all([ line.rsplit(' ', 1)[1].isdigit() for line in lines ]))
+
+            self.assertRaises(ValueError, profiling.profile_call, lambda: None, path, 'svg')
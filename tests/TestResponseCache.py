@@ -0,0 +1,24 @@
+import time
+import unittest
+from ResponseCache import ResponseCache
+
+class TestResponseCacheMethods(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = ResponseCache(max_size=2)
+        cache.put("trip", 1)
+        cache.put("troop", 2)
+        self.assertEqual(cache.get("trip"), 1) # troop is now the least recently used
+        cache.put("true", 3)
+        self.assertIsNone(cache.get("troop"))
+        self.assertEqual(cache.get("true"), 3)
+        self.assertEqual(cache.stats()["size"], 2)
+        self.assertEqual(cache.hit_rate(), 2 / 3)
+
+    def test_entries_expire(self):
+        cache = ResponseCache(ttl=0.05)
+        cache.put("trip", 1)
+        self.assertEqual(cache.get("trip"), 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.get("trip", "expired"), "expired")
+        self.assertEqual(cache.stats()["size"], 0)
@@ -0,0 +1,96 @@
+import os
+import tempfile
+import threading
+import unittest
+from app import app, routes
+from ResponseCache import ResponseCache
+from SentenceBatcher import SentenceBatcher
+
+class FakeTransphoner:
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def gen_sentences(self, input_mnemonics, mask_predict_passes=None):
+        self.release.wait()
+        self.calls.append(list(input_mnemonics))
+        return [ mnemonic + " sentence" for mnemonic in input_mnemonics ]
+
+class TestRoutesMethods(unittest.TestCase):
+
+    def setUp(self):
+        self.config = dict(app.config)
+        app.config.update(WTF_CSRF_ENABLED=False)
+        routes.mnemonicCache = ResponseCache()
+        self.transphoner = FakeTransphoner()
+        routes.transphoners.sentence_batcher = SentenceBatcher(self.transphoner, max_wait=0)
+        self.client = app.test_client()
+
+    def tearDown(self):
+        self.transphoner.release.set()
+        app.config.clear()
+        app.config.update(self.config)
+        routes.transphoners.sentence_batcher = None
+
+    def post(self, **body):
+        request = {"inputLang": "en", "outputLang": "zh", "words": ["paper", "elephant"], "sentences": False}
+        request.update(body)
+        response = self.client.post('/api/mnemonics', json=request)
+        return response.status_code, response.get_json()
+
+    def test_api_validation(self):
+        self.assertEqual(self.post(N=True)[0], 400)
+        self.assertEqual(self.post(N=0)[0], 400)
+        self.assertEqual(self.post(words=[])[0], 400)
+        self.assertEqual(self.post(inputLang="xx")[0], 400)
+        for weight in [-1, True, "5", float('inf')]:
+            self.assertEqual(self.post(weights={"phonetic": weight})[0], 400)
+        self.assertEqual(self.post(weights={"loudness": 1})[0], 400)
+        response = self.client.post('/api/mnemonics', data='{"inputLang": "en", "outputLang": "zh", "words": ["paper"], "weights": {"phonetic": NaN}}', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        status, body = self.post(words=["paper", {"word": "elephant"}, "notaword"], N=3, weights={"phonetic": 4.0})
+        self.assertEqual(status, 200)
+        self.assertFalse(body['partial'])
+        self.assertEqual([ len(result['mnemonics']) for result in body['results'][:2] ], [3, 3])
+        self.assertIn('error', body['results'][2])
+
+    def test_api_partial_search(self):
+        app.config['API_TIME_LIMIT'] = 0
+        status, body = self.post(words=["tropical", "mother"])
+        self.assertEqual(status, 200)
+        self.assertTrue(body['partial'])
+        self.assertEqual(len(routes.mnemonicCache.entries), 0) # cut short results aren't cached
+
+    def test_api_sentences_in_chunks(self):
+        app.config['SENTENCE_BATCH_SIZE'] = 4
+        status, body = self.post(outputLang="en", sentences=True, N=3)
+        self.assertEqual(status, 200)
+        self.assertFalse(body['partial'])
+        for result in body['results']:
+            self.assertEqual(result['sentences'], [ mnemonic + " sentence" for mnemonic in result['mnemonics'] ])
+        self.assertTrue(all([ len(call) <= 4 for call in self.transphoner.calls ]))
+
+        self.transphoner.release.clear() # sentences that aren't generated in time are left out
+        app.config['API_SENTENCE_TIME_LIMIT'] = 0
+        status, body = self.post(outputLang="en", sentences=True, N=3)
+        self.assertTrue(body['partial'])
+        self.assertTrue(all([ sentence is None for result in body['results'] for sentence in result['sentences'] ]))
+
+    def test_profile_header_needs_secret(self):
+        form = {'inputWord': 'paper', 'inputLang': 'en', 'outputLang': 'zh', 'numMatches': '5', 'translation': ''}
+        with tempfile.TemporaryDirectory() as directory:
+            app.config.update(PROFILE_DIR=directory, PROFILE_SECRET='tropisch')
+            for header in ['trop', 'tr\u00f6pisch']: # a wrong secret, a non ascii one too, isn't an error
+                self.assertEqual(self.client.post('/', data=form, headers={'X-Profile': header}).status_code, 200)
+            self.assertEqual(os.listdir(directory), [])
+            self.client.post('/', data=form, headers={'X-Profile': 'tropisch'})
+            self.assertEqual(len(os.listdir(directory)), 1)
+
+    def test_unknown_sentence_job(self):
+        response = self.client.get('/sentences/tropisch')
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(response.get_json()['done'])
+        self.assertIn('error', response.get_json())
@@ -0,0 +1,84 @@
+import threading
+import time
+import unittest
+import MatchList
+from SearchBudget import SearchBudget
+from SearchTrace import SearchTrace
+from WWUTransphoner import WWUTransphoner
+
+class TestSearchBudgetMethods(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.wwut = WWUTransphoner('en', 'en')
+
+    def test_limits_exhaust_budget(self):
+        full = self.wwut.get_mnemonics('elephant')
+        for budget in [SearchBudget(max_nodes=10), SearchBudget(max_rounds=1), SearchBudget(time_limit=0)]:
+            mnemonics = self.wwut.get_mnemonics('elephant', budget=budget)
+            self.assertTrue(budget.exhausted)
+            self.assertEqual(mnemonics, full[:len(mnemonics)])
+
+        budget = SearchBudget(max_rounds=2) # some matches finish in time, the best ones found so far are returned
+        mnemonics = self.wwut.get_mnemonics('elephant', budget=budget)
+        self.assertTrue(budget.exhausted)
+        self.assertTrue(0 < len(mnemonics) < len(full))
+        self.assertEqual(mnemonics, full[:len(mnemonics)])
+
+        budget = SearchBudget(time_limit=60, max_nodes=10**9, max_rounds=1000)
+        self.assertEqual(self.wwut.get_mnemonics('elephant', budget=budget), full)
+        self.assertFalse(budget.exhausted)
+
+    def test_budget_reuse(self):
+        budget = SearchBudget(max_nodes=10**9)
+        self.wwut.get_mnemonics('tropical', budget=budget)
+        nodes_visited, rounds = budget.nodes_visited, budget.rounds
+        self.assertGreater(nodes_visited, 0)
+        self.wwut.get_mnemonics('tropical', budget=budget) # restarted, not added to
+        self.assertEqual((budget.nodes_visited, budget.rounds), (nodes_visited, rounds))
+
+        budget = SearchBudget(time_limit=0.01)
+        time.sleep(0.02)
+        self.assertTrue(budget.is_exhausted())
+        budget.start()
+        self.assertFalse(budget.exhausted)
+        self.assertEqual((budget.nodes_visited, budget.rounds), (0, 0))
+
+    def test_follower_shares_exhausted_budget(self):
+        self.assertIsNone(WWUTransphoner.share_budget(None, SearchBudget()))
+        budget = SearchBudget()
+        budget.exhausted = True
+        WWUTransphoner.share_budget(budget, budget) # a call's own search already set it
+        self.assertTrue(budget.exhausted)
+
+        # a call that joins an identical search cut short by the leader's budget is marked exhausted too
+        leader_budget = SearchBudget(max_rounds=1)
+        key = ('get_mnemonics', 'mother', None, 5, False, MatchList.current_weights())
+        def search():
+            while not self.wwut.flights.flights[key].followers:
+                time.sleep(0.001)
+            return self.wwut.get_mnemonics('mother', budget=leader_budget, trace=SearchTrace()) # traced, so it doesn't join its own flight
+        leader = threading.Thread(target=lambda: self.wwut.flights.do(key, search, leader_budget))
+        leader.start()
+        while key not in self.wwut.flights.flights:
+            time.sleep(0.001)
+        follower_budget = SearchBudget(time_limit=60)
+        mnemonics = self.wwut.get_mnemonics('mother', budget=follower_budget)
+        leader.join()
+        self.assertTrue(leader_budget.exhausted)
+        self.assertTrue(follower_budget.exhausted)
+        self.assertEqual(mnemonics, ['mother'])
+
+    def test_batch_under_budget(self):
+        words = ["elephant", "tropical", "mother"]
+        full = self.wwut.get_mnemonics_batch(words)
+        budget = SearchBudget(max_rounds=2)
+        partial = self.wwut.get_mnemonics_batch(words, budget=budget)
+        self.assertTrue(budget.exhausted)
+        self.assertEqual(len(partial), len(words))
+        for mnemonics, best in zip(partial, full):
+            self.assertEqual(mnemonics, best[:len(mnemonics)])
+
+        budget = SearchBudget(time_limit=60)
+        self.assertEqual(self.wwut.get_mnemonics_batch(words, budget=budget), full)
+        self.assertFalse(budget.exhausted)
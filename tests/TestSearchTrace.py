@@ -0,0 +1,43 @@
+import unittest
+import aline
+import MatchList
+from SearchTrace import SearchTrace
+from WWUTransphoner import WWUTransphoner
+
+class TestSearchTraceMethods(unittest.TestCase):
+
+    def test_trace_counts_search(self):
+        wwut = WWUTransphoner('en', 'zh')
+        trace = SearchTrace()
+        mnemonics = wwut.get_mnemonics('elephant', trace=trace)
+        self.assertEqual(mnemonics, wwut.get_mnemonics('elephant'))
+        self.assertFalse(trace.stored)
+        self.assertGreater(trace.rounds, 0)
+        self.assertGreaterEqual(trace.trie_searches, trace.rounds)
+        self.assertGreaterEqual(trace.nodes_visited, trace.trie_searches)
+        self.assertGreaterEqual(trace.delta_calls, trace.nodes_visited) # plus the alignments not cached yet
+        self.assertGreater(trace.pruned_subtrees, 0)
+        self.assertGreater(trace.expansions, 0)
+        self.assertEqual(trace.semantic_lookups, 0) # no translation
+
+        rounds = trace.rounds
+        list(wwut.iter_mnemonics('elephant', trace=trace))
+        self.assertEqual(trace.rounds, rounds) # restarted, not added to
+
+    def test_trace_counts_delta_calls(self):
+        wwut = WWUTransphoner('en', 'zh')
+        def delta_calls():
+            info = aline.delta.cache_info() # counts every call, the trie searches' and the alignments'
+            return info.hits + info.misses
+
+        MatchList.alignment_end.cache_clear()
+        trace = SearchTrace()
+        before = delta_calls()
+        wwut.get_mnemonics('tropical', trace=trace)
+        self.assertEqual(trace.delta_calls, delta_calls() - before)
+        self.assertGreater(trace.delta_calls, trace.nodes_visited)
+
+        before = delta_calls() # the alignments are cached now, only the trie searches call delta
+        wwut.get_mnemonics('tropical', trace=trace)
+        self.assertEqual(trace.delta_calls, delta_calls() - before)
+        self.assertEqual(trace.delta_calls, trace.nodes_visited)
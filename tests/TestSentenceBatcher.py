@@ -0,0 +1,66 @@
+import threading
+import unittest
+from SentenceBatcher import SentenceBatcher
+
+class FakeTransphoner:
+
+    def __init__(self):
+        self.calls = []
+
+    def gen_sentences(self, input_mnemonics, mask_predict_passes=None):
+        self.calls.append(list(input_mnemonics))
+        return [ mnemonic + " sentence" for mnemonic in input_mnemonics ]
+
+class TestSentenceBatcherMethods(unittest.TestCase):
+
+    def test_concurrent_calls_share_batch(self):
+        transphoner = FakeTransphoner()
+        batcher = SentenceBatcher(transphoner, max_wait=0.2)
+        results = {}
+        def call(mnemonics):
+            results[mnemonics[0]] = batcher.gen_sentences(mnemonics)
+        threads = [ threading.Thread(target=call, args=([word, word + " two"],)) for word in ["trip", "troop", "true"] ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(transphoner.calls), 1)
+        self.assertEqual(results["troop"], ["troop sentence", "troop two sentence"])
+
+    def test_errors_reach_caller(self):
+        transphoner = FakeTransphoner()
+        transphoner.gen_sentences = lambda mnemonics, passes=None: 1 / 0
+        batcher = SentenceBatcher(transphoner, max_wait=0)
+        self.assertRaises(ZeroDivisionError, batcher.gen_sentences, ["trip ash"])
+        self.assertEqual(batcher.gen_sentences([]), [])
+
+    def test_submit_returns_before_generation(self):
+        transphoner = FakeTransphoner()
+        release = threading.Event()
+        gen_sentences = transphoner.gen_sentences
+        transphoner.gen_sentences = lambda mnemonics, passes=None: release.wait() and gen_sentences(mnemonics)
+        batcher = SentenceBatcher(transphoner, max_wait=0)
+        future = batcher.submit(["trip ash"])
+        self.assertFalse(future.done())
+        release.set()
+        self.assertEqual(future.result(timeout=5), ["trip ash sentence"])
+
+    def test_identical_pending_calls_coalesce(self):
+        transphoner = FakeTransphoner()
+        release = threading.Event()
+        gen_sentences = transphoner.gen_sentences
+        transphoner.gen_sentences = lambda mnemonics, passes=None: release.wait() and gen_sentences(mnemonics)
+        batcher = SentenceBatcher(transphoner, max_wait=0)
+        first = batcher.submit(["trip ash", "troop ash"])
+        self.assertIs(batcher.submit(["trip ash", "troop ash"]), first)
+        self.assertIsNot(batcher.submit(["trip ash", "troop ash"], 3), first)
+        release.set()
+        self.assertEqual(first.result(timeout=5), ["trip ash sentence", "troop ash sentence"])
+        self.assertIsNot(batcher.submit(["trip ash", "troop ash"]), first) # done calls aren't reused
+
+    def test_large_calls_are_generated_in_chunks(self):
+        transphoner = FakeTransphoner()
+        batcher = SentenceBatcher(transphoner, max_wait=0, max_batch_size=4)
+        mnemonics = [ "trip ash " + str(i) for i in range(10) ]
+        self.assertEqual(batcher.gen_sentences(mnemonics), [ mnemonic + " sentence" for mnemonic in mnemonics ])
+        self.assertEqual([ len(call) for call in transphoner.calls ], [4, 4, 2])
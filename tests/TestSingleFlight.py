@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+from SingleFlight import SingleFlight
+
+class TestSingleFlightMethods(unittest.TestCase):
+
+    def test_identical_calls_share_one_computation(self):
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        def search():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return ["trip ash"]
+        results = []
+        leader = threading.Thread(target=lambda: results.append(flights.do("tropisch", search, "leader")))
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=lambda: results.append(flights.do("tropisch", search, "follower")))
+        follower.start()
+        while not flights.flights["tropisch"].followers: # only release the leader once the follower joined
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [(["trip ash"], "leader")] * 2)
+        self.assertEqual(flights.flights, {})
+
+    def test_iterate_shares_items_and_errors(self):
+        flights = SingleFlight()
+        def search():
+            yield "trip ash"
+            raise KeyError("tropisch")
+        items, _ = flights.iterate("tropisch", search)
+        self.assertEqual(next(items), "trip ash")
+        self.assertRaises(KeyError, next, items)
+
+    def test_iterate_runs_on_the_callers_thread(self):
+        flights = SingleFlight()
+        threads = []
+        def search():
+            threads.append(threading.current_thread())
+            yield "trip ash"
+        items, _ = flights.iterate("tropisch", search)
+        self.assertEqual(list(items), ["trip ash"])
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(flights.flights, {})
+
+    def test_iterate_finishes_for_followers_when_leader_stops(self):
+        flights = SingleFlight()
+        def search():
+            yield from ["trip ash", "troop ash", "true push"]
+        leader, _ = flights.iterate("tropisch", search, "leader")
+        self.assertEqual(next(leader), "trip ash")
+        follower, context = flights.iterate("tropisch", search, "follower")
+        self.assertEqual(context, "leader")
+        leader.close()
+        self.assertEqual(list(follower), ["trip ash", "troop ash", "true push"])
+        self.assertEqual(flights.flights, {})
+
+        leader, _ = flights.iterate("tropisch", search)
+        next(leader)
+        leader.close() # nobody follows, so the search just stops
+        self.assertEqual(flights.flights, {})
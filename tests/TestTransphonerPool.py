@@ -0,0 +1,27 @@
+import threading
+import unittest
+from TransphonerPool import TransphonerPool
+
+class TestTransphonerPoolMethods(unittest.TestCase):
+
+    def test_one_transphoner_per_pair(self):
+        pool = TransphonerPool()
+        results = []
+        threads = [ threading.Thread(target=lambda: results.append(pool.get('en', 'zh'))) for _ in range(4) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertTrue(all([ transphoner is results[0] for transphoner in results ]))
+        self.assertTrue(pool.is_loaded('en', 'zh'))
+        self.assertFalse(pool.is_loaded('zh', 'en'))
+
+        other = pool.get('zh', 'en')
+        self.assertIsNot(other, results[0])
+        self.assertIs(other.input_trie, results[0].target_trie) # tries are shared between pairs
+
+    def test_quantized_flag(self):
+        self.assertFalse(TransphonerPool().get('en', 'zh').quantized)
+        pool = TransphonerPool(quantized=True)
+        self.assertTrue(pool.get('en', 'zh').quantized)
+        self.assertTrue(pool.get('en', 'en').quantized) # the transphoner the sentences are generated with
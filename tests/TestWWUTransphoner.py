@@ -0,0 +1,79 @@
+import importlib.util
+import unittest
+from collections import namedtuple
+from WWUTransphoner import WWUTransphoner
+
+class FakeBertTokenizer:
+
+    # word piece ids: padding, sentence start and end, mask and a quote that is never predicted
+    vocab = ["[PAD]", "[CLS]", "[SEP]", "[MASK]", '"', "trip", "ash", "a", "big", "red", "cat", "sat", "on"]
+    mask_token_id = 3
+
+    def __call__(self, texts, return_tensors=None, padding=False):
+        import torch
+        ids = [ [1] + [ self.vocab.index(token) for token in text.split() ] + [2] for text in texts ]
+        length = max([ len(row) for row in ids ])
+        return {"input_ids": torch.tensor([ row + [0] * (length - len(row)) for row in ids ])}
+
+    def decode(self, ids):
+        return ' '.join([ self.vocab[id] for id in ids ])
+
+class FakeBertModel:
+
+    Output = namedtuple('Output', ['logits'])
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, input_ids):
+        # every position predicts a word, the quote always scores highest but is banned
+        import torch
+        self.calls += 1
+        logits = torch.zeros(input_ids.shape + (len(FakeBertTokenizer.vocab),))
+        for position in range(input_ids.shape[1]):
+            logits[:, position, 7 + position % 6] = 1.0 + position
+        logits[:, :, 4] = 100.0
+        return FakeBertModel.Output(logits)
+
+def embeddings_pulled() -> bool:
+    with open("word_embeddings/english/glove.6B.50d.txt") as f:
+        return not f.readline().startswith("version https://git-lfs") # still the git lfs pointer
+
+class TestWWUTransphonerMethods(unittest.TestCase):
+
+    def test_iter_mnemonics_matches_get_mnemonics(self):
+        wwut = WWUTransphoner('en', 'zh')
+        for word in ["elephant", "paper", "tropical", "mother", "sister"]:
+            for N in [1, 5, 6]:
+                words, phones, input_phones = wwut.get_mnemonics(word, N=N, include_phones=True)
+                self.assertEqual(list(wwut.iter_mnemonics(word, N=N)), [ (w, p, input_phones) for w, p in zip(words, phones) ])
+
+    def test_batch_matches_loop(self):
+        wwut = WWUTransphoner('en', 'zh')
+        words = ["elephant", "paper", "tropical", "mother", "sister", "sang"]
+        self.assertEqual(wwut.get_mnemonics_batch(words, N=5, include_phones=True), [ wwut.get_mnemonics(word, N=5, include_phones=True) for word in words ])
+
+    @unittest.skipUnless(embeddings_pulled(), "needs the word embeddings, run git lfs pull")
+    def test_batch_matches_loop_with_translations(self):
+        wwut = WWUTransphoner('en', 'en')
+        words = ["elephant", "paper", "tropical", "mother", "sister", "sang"]
+        translations = ["animal", None, "warm", "parent", "sibling", "sing"]
+        loop = [ wwut.get_mnemonics(word, translation, N=5, include_phones=True) for word, translation in zip(words, translations) ]
+        self.assertEqual(wwut.get_mnemonics_batch(words, translations, N=5, include_phones=True), loop)
+
+    @unittest.skipUnless(importlib.util.find_spec('torch'), "needs torch")
+    def test_mask_predict_sentence_beginnings(self):
+        import torch
+        wwut = WWUTransphoner('en', 'en')
+        wwut.bert_tokenizer = FakeBertTokenizer()
+        wwut.bert_model = FakeBertModel()
+        wwut.bert_banned_ids = torch.tensor([0, 1, 2, 3, 4])
+
+        incomplete_sentences = ["trip ash", "trip ash sat on a cat"]
+        sentences = wwut._WWUTransphoner__gen_sentence_beginnings_mask_predict(incomplete_sentences, 3)
+        self.assertEqual(wwut.bert_model.calls, 3) # a fixed number of passes
+        for sentence, incomplete_sentence in zip(sentences, incomplete_sentences):
+            self.assertTrue(sentence.endswith(' ' + incomplete_sentence))
+            new_words = sentence[:-len(incomplete_sentence) - 1].split()
+            self.assertTrue(3 <= len(new_words) <= 7)
+            self.assertTrue(all([ word in FakeBertTokenizer.vocab[5:] for word in new_words ])) # no masks or banned tokens